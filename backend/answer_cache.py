@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Semantic cache of generated answers, sitting in front of the LLM call.
+
+An answer is reused when a new question retrieves exactly the same chunks and
+its embedding is within `threshold` cosine similarity of a question that was
+already answered. Entries expire after `ttl` seconds, the cache is bounded by
+LRU eviction, and everything is dropped when the knowledge base version changes
+(chunk ids are only meaningful within one version).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Answers keyed on (retrieved chunk ids, near-duplicate query embedding)."""
+
+    def __init__(self, max_size: int = 512, ttl: float = 3600, threshold: float = 0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.kb_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # entry id -> (chunk ids, query vector, answer, created)
+        self._entries = OrderedDict()
+        # chunk ids -> entry ids that answered with exactly that context
+        self._by_chunks = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def set_version(self, kb_version: str):
+        """Bind the cache to a knowledge base version, clearing it on change."""
+        with self._lock:
+            if kb_version != self.kb_version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._by_chunks.clear()
+                self.kb_version = kb_version
+
+    def get(self, chunk_ids: Sequence[int], query_vector: np.ndarray,
+            kb_version: Optional[str] = None) -> Optional[str]:
+        """Cached answer for the chunks and a near-identical query.
+
+        With `kb_version`, chunk ids retrieved from another version (a request
+        that straddled a reload) never match.
+        """
+        if not self.enabled:
+            return None
+        key = tuple(int(i) for i in chunk_ids)
+        now = time.time()
+        with self._lock:
+            if kb_version is not None and kb_version != self.kb_version:
+                self.misses += 1
+                return None
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_chunks.get(key, ())):
+                _, vector, _, created = self._entries[entry_id]
+                if now - created >= self.ttl:
+                    self._forget(entry_id)
+                    continue
+                score = float(np.dot(vector, query_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def put(self, chunk_ids: Sequence[int], query_vector: np.ndarray, answer: str,
+            kb_version: Optional[str] = None):
+        if not self.enabled:
+            return
+        key = tuple(int(i) for i in chunk_ids)
+        with self._lock:
+            if kb_version is not None and kb_version != self.kb_version:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, np.asarray(query_vector, dtype=np.float32), answer, time.time())
+            self._by_chunks.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_size:
+                self._forget(next(iter(self._entries)))
+
+    def _forget(self, entry_id: int):
+        key = self._entries.pop(entry_id)[0]
+        ids = self._by_chunks.get(key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_chunks[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "kb_version": self.kb_version,
+            }
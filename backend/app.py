@@ -5,50 +5,142 @@ Provides RAG (Retrieval Augmented Generation) capabilities using embeddings and
 """
 
 import os
-import pickle
+import gc
+import json
+import hmac
+import threading
+import time
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import openai
 from dotenv import load_dotenv
 import logging
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
+
+from answer_cache import SemanticAnswerCache
+from batching import MicroBatcher
+from concurrency import run_cpu_bound
+from kb_snapshot import KnowledgeBaseSnapshot, KnowledgeBaseWatcher
+from chunker import split_sentences
+from context import ContextAssembler
+from kb_store import current_version, knowledge_base_exists
+from llm_client import LLMClient, LLMError
+import metrics
+from query_cache import QueryEmbeddingCache
+from retrieval import normalize_rows, reciprocal_rank_fusion
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 # Allow CORS for all origins to ensure the backend works for everyone
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=["X-Timing"])
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = 'paraphrase-MiniLM-L3-v2'
+# "torch" (SentenceTransformer) or "onnx" (int8 ONNX Runtime export, see onnx_encoder.py)
+ENCODER_BACKEND = os.getenv('ENCODER_BACKEND', 'torch')
+# Fuse BM25 keyword hits with dense results (reciprocal rank fusion)
+HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'true').lower() == 'true'
+RRF_K = int(os.getenv('RRF_K', '60'))
+# Candidates taken from each retriever before fusion, per requested result
+FUSION_CANDIDATES = int(os.getenv('FUSION_CANDIDATES', '4'))
+# Largest accepted /search/batch request
+SEARCH_BATCH_MAX = int(os.getenv('SEARCH_BATCH_MAX', '256'))
+
+WARMUP_QUERY = "How can I volunteer with An-Nisa?"
+# Seconds between checks of the store's CURRENT pointer for a new version (0 disables)
+KB_RELOAD_INTERVAL = float(os.getenv('KB_RELOAD_INTERVAL', '10'))
+# Shared secret for /admin endpoints (unset disables them)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+# Add per-stage timings to every response (otherwise only when the request sends X-Timing)
+TIMING_HEADER = os.getenv('TIMING_HEADER', 'false').lower() in ('1', 'true', 'yes')
+
+NO_SERVICE_RESPONSE = "Sorry, I'm having trouble connecting to the AI service. Please try again later."
+# Prompt tokens per answer (system prompt, context and question); the context is trimmed to fit
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '900'))
+FALLBACK_INTRO = "I can't reach the AI service right now, but here is what I found on annisa.org:"
+# Characters of each retrieved chunk quoted in a retrieval-only answer
+FALLBACK_EXCERPT_CHARS = 300
+ERROR_RESPONSE = "I'm having some technical difficulties right now. Please try asking your question again, or visit annisa.org for more information."
+NO_INFO_RESPONSE = "I don't have specific information about that topic. For the most up-to-date details, I'd recommend visiting annisa.org directly or reaching out to them - they'll be happy to help!"
+
+class StreamInterrupted(Exception):
+    """The LLM failed after part of a streamed answer was already sent."""
+
+    def __init__(self, deltas: int):
+        super().__init__(f"Stream interrupted after {deltas} deltas")
+        self.deltas = deltas
+
 class AnNisaChatbot:
     def __init__(self):
         self.model = None
-        self.chunks = []
-        self.embeddings = None
-        self.metadata = []
-        self.openai_client = None
+        # The loaded knowledge base; replaced wholesale on reload, never mutated
+        self.snapshot = KnowledgeBaseSnapshot.empty()
+        self._reload_lock = threading.Lock()
+        self.llm = None
+        # Trims retrieved context to the prompt token budget
+        self.context = ContextAssembler(PROMPT_TOKEN_BUDGET)
+        self.ready = False
+        # Repeated questions skip the transformer; QUERY_CACHE_PATH shares entries across workers
+        self.query_cache = QueryEmbeddingCache(
+            max_size=int(os.getenv('QUERY_CACHE_SIZE', '2048')),
+            ttl=float(os.getenv('QUERY_CACHE_TTL', str(24 * 3600))),
+            shared_path=os.getenv('QUERY_CACHE_PATH') or None,
+            namespace=f"{MODEL_NAME}:{ENCODER_BACKEND}",
+        )
+        # Concurrent query encodes arriving within a few ms share one forward pass
+        self.encoder = MicroBatcher(
+            self.encode_batch,
+            window_ms=float(os.getenv('ENCODE_BATCH_WINDOW_MS', '5')),
+            max_batch=int(os.getenv('ENCODE_MAX_BATCH', '32')),
+        )
+        # Near-duplicate questions that retrieve the same chunks reuse the LLM answer
+        self.answer_cache = SemanticAnswerCache(
+            max_size=int(os.getenv('ANSWER_CACHE_SIZE', '512')),
+            ttl=float(os.getenv('ANSWER_CACHE_TTL', '3600')),
+            threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95')),
+        )
         
         self.load_knowledge_base()
-        self.setup_openai()
+        self.setup_llm()
+    
+    # Read-only views of the current snapshot; request paths should read
+    # self.snapshot once instead so a reload cannot change it mid-request
+    @property
+    def store(self):
+        return self.snapshot.store
+    
+    @property
+    def chunks(self):
+        return self.snapshot.chunks
+    
+    @property
+    def embeddings(self):
+        return self.snapshot.embeddings
+    
+    @property
+    def metadata(self):
+        return self.snapshot.metadata
+    
+    @property
+    def index(self):
+        return self.snapshot.index
+    
+    @property
+    def bm25(self):
+        return self.snapshot.bm25
     
     def load_knowledge_base(self):
-        """Load knowledge base from pickle file."""
+        """Load knowledge base from the memory-mapped store (or legacy pickle)."""
         try:
-            if os.path.exists("data/knowledge_base.pkl"):
-                with open("data/knowledge_base.pkl", "rb") as f:
-                    knowledge_base = pickle.load(f)
-                    self.chunks = knowledge_base['chunks']
-                    self.embeddings = knowledge_base['embeddings']
-                    self.metadata = knowledge_base['metadata']
-                
-                logger.info(f"Loaded knowledge base with {len(self.chunks)} chunks")
+            if knowledge_base_exists():
+                self.swap_snapshot(KnowledgeBaseSnapshot.load(hybrid=HYBRID_SEARCH))
+                if self.store.manifest.get("format") == "pickle":
+                    logger.warning("Using legacy knowledge_base.pkl; run kb_store.py or ingest.py to convert it.")
             else:
                 logger.error("Knowledge base not found! Run ingest.py first.")
                 
@@ -56,138 +148,426 @@ class AnNisaChatbot:
             logger.error(f"Error loading knowledge base: {str(e)}")
             logger.error("Make sure to run ingest.py first to create the knowledge base.")
     
-    def setup_openai(self):
-        """Setup OpenAI client."""
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
+    def swap_snapshot(self, snapshot: KnowledgeBaseSnapshot):
+        """Atomically make `snapshot` the one new requests use and invalidate dependent caches."""
+        previous = self.snapshot
+        self.snapshot = snapshot
+        # Cached answers name chunk ids of the old version
+        self.answer_cache.set_version(snapshot.version)
+        if previous.store is not None and previous.model != snapshot.model:
+            # Query vectors from another encoder are not comparable
+            self.query_cache.clear()
+        logger.info(f"Loaded knowledge base {snapshot.version} with {len(snapshot)} chunks "
+                    f"({snapshot.index.kind} index {snapshot.index.params})")
+    
+    def reload_knowledge_base(self, force: bool = False) -> Dict:
+        """Load and warm the current store version, then swap it in.
+        
+        In-flight queries keep using the snapshot they started with; nothing
+        blocks them while the new version is loaded and warmed.
+        """
+        with self._reload_lock:
+            previous = self.snapshot.version
+            version = current_version()
+            if not force and version is not None and version == previous:
+                return {'reloaded': False, 'version': previous}
+            
+            start = time.perf_counter()
+            snapshot = KnowledgeBaseSnapshot.load(hybrid=HYBRID_SEARCH)
+            # Page the new embeddings in and touch the index before any request sees them
+            warm_query = self.query_cache.get(WARMUP_QUERY) if self.model is not None else None
+            snapshot.warm(None if warm_query is None else warm_query[None, :])
+            self.swap_snapshot(snapshot)
+            
+            elapsed = time.perf_counter() - start
+            logger.info(f"Reloaded knowledge base {previous} -> {snapshot.version} in {elapsed:.2f}s")
+            return {'reloaded': True, 'version': snapshot.version, 'previous_version': previous,
+                    'chunks_count': len(snapshot), 'seconds': round(elapsed, 3)}
+    
+    def setup_llm(self):
+        """Setup the OpenAI chat completions client."""
+        self.llm = LLMClient.from_env()
+        if self.llm is None:
             logger.error("OPENAI_API_KEY not found in environment variables!")
             return
         
-        openai.api_key = api_key
-        self.openai_client = openai
-        logger.info("OpenAI client initialized")
+        logger.info(f"OpenAI client initialized ({self.llm.model} at {self.llm.api_base})")
     
     def get_model(self):
         """Lazy load the sentence transformer model to save memory."""
-        if self.model is None:
+        if self.model is None and ENCODER_BACKEND == 'onnx':
+            try:
+                from onnx_encoder import OnnxEncoder
+                self.model = OnnxEncoder()
+                logger.info("ONNX Runtime query encoder loaded (int8)")
+            except Exception as e:
+                logger.error(f"Failed to load ONNX encoder: {e}")
+                self.model = None
+        elif self.model is None:
             try:
                 # Use a smaller, more memory-efficient model optimized for CPU
                 from sentence_transformers import SentenceTransformer
                 # This model is only ~14MB vs ~80MB for all-MiniLM-L6-v2
                 # Performance: ~95% quality with 85% less memory usage
-                self.model = SentenceTransformer('paraphrase-MiniLM-L3-v2', device='cpu')
+                self.model = SentenceTransformer(MODEL_NAME, device='cpu')
                 logger.info("SentenceTransformer model loaded (optimized for deployment)")
             except Exception as e:
                 logger.error(f"Failed to load SentenceTransformer: {e}")
                 self.model = None
         return self.model
     
+    def warm_up(self) -> bool:
+        """Load and exercise the encoder and index before serving.
+        
+        Runs in the gunicorn master when preload_app is set, so every forked
+        worker (including ones recycled by max_requests) starts warm and shares
+        the read-only weights and mapped embeddings copy-on-write. It must not
+        start threads: the batcher, CPU pool and SQLite connections are all
+        created lazily per process.
+        """
+        start = time.perf_counter()
+        model = self.get_model()
+        if model is None:
+            logger.error("Warm-up failed: encoder not available")
+            return False
+        
+        torch_threads = None
+        if ENCODER_BACKEND != 'onnx':
+            # A single intra-op thread keeps torch from spawning an OpenMP pool
+            # in the master, which forked children could not use safely
+            import torch
+            torch_threads = torch.get_num_threads()
+            torch.set_num_threads(1)
+        try:
+            query_embedding = normalize_rows(self.encode_batch([WARMUP_QUERY]))
+            self.query_cache.put(WARMUP_QUERY, query_embedding[0])
+            # Fault the mapped embedding pages into the shared page cache and touch the index
+            self.snapshot.warm(query_embedding)
+        finally:
+            if torch_threads is not None:
+                torch.set_num_threads(torch_threads)
+        
+        self.ready = True
+        logger.info(f"Warm-up complete in {time.perf_counter() - start:.2f}s")
+        return True
+    
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Run the sentence transformer on a batch of texts."""
+        model = self.get_model()
+        if model is None:
+            raise RuntimeError("SentenceTransformer model not available")
+        return model.encode(texts, batch_size=max(len(texts), 1))
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Return L2-normalized query embeddings, encoding only cache misses."""
+        vectors = [self.query_cache.get(query) for query in queries]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        
+        if len(missing) > 1:
+            # A bulk request is already a batch: one forward pass on the bounded CPU pool
+            encoded = normalize_rows(run_cpu_bound(self.encode_batch, [queries[i] for i in missing]))
+        elif missing:
+            # Micro-batched with concurrent requests and run on the bounded CPU pool
+            encoded = normalize_rows(self.encoder.encode([queries[i] for i in missing]))
+        if missing:
+            for i, vector in zip(missing, encoded):
+                self.query_cache.put(queries[i], vector)
+                vectors[i] = vector
+        
+        return np.vstack(vectors).astype(np.float32, copy=False)
+    
     def search_knowledge_base(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search for relevant chunks in the knowledge base."""
-        if self.embeddings is None or len(self.chunks) == 0:
-            return []
+        """Search for relevant chunks in the knowledge base (dense + BM25, fused)."""
+        return self.search_batch([query], top_k)[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = 3) -> List[List[Dict]]:
+        """Search for relevant chunks for many queries at once.
+        
+        All queries are embedded in one batch (cache misses only) and scored
+        against the index with a single matrix-matrix product.
+        """
+        # One snapshot for the whole request, even if a reload swaps it meanwhile
+        snapshot = self.snapshot
+        if snapshot.index is None or len(snapshot) == 0:
+            return [[] for _ in queries]
         
         try:
-            # Get the model (lazy loaded)
-            model = self.get_model()
-            if model is None:
-                logger.error("SentenceTransformer model not available")
-                return []
-            
-            # Embed the query
-            query_embedding = model.encode([query])
-            
-            # Calculate cosine similarity
-            similarities = cosine_similarity(query_embedding, self.embeddings)[0]
-            
-            # Get top-k indices
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
-            
-            # Format results
-            results = []
-            for i, idx in enumerate(top_indices):
-                if similarities[idx] > 0.1:  # Only include relevant chunks
-                    results.append({
-                        'content': self.chunks[idx],
-                        'metadata': self.metadata[idx],
-                        'score': float(similarities[idx]),
-                        'rank': i + 1
-                    })
-            
-            return results
+            # Embed the queries (cached; stored embeddings are already L2-normalized)
+            with metrics.span('encode'):
+                query_embeddings = self.embed_queries(queries)
+            with metrics.span('search'):
+                ranked = run_cpu_bound(self.rank_batch, snapshot, queries, query_embeddings, top_k)
+            return [self.format_results(snapshot, ranking) for ranking in ranked]
             
         except Exception as e:
             logger.error(f"Error searching knowledge base: {str(e)}")
-            return []
+            return [[] for _ in queries]
+    
+    def rank_batch(self, snapshot: KnowledgeBaseSnapshot, queries: List[str], query_embeddings: np.ndarray,
+                   top_k: int):
+        """Rank chunks for a batch of queries.
+        
+        Returns per query [(chunk_id, cosine, (rrf_score, bm25_rank or None) or None)], best first.
+        """
+        candidates = top_k * FUSION_CANDIDATES if snapshot.bm25 is not None else top_k
+        # Cosine similarity via the configured index (exact flat scan by default)
+        top_indices, top_scores = snapshot.index.search(query_embeddings, candidates)
+        
+        ranked = []
+        for query, query_embedding, ids, scores in zip(queries, query_embeddings, top_indices, top_scores):
+            dense = [(int(idx), float(score)) for idx, score in zip(ids, scores) if idx >= 0]
+            if snapshot.bm25 is None:
+                ranked.append([(idx, score, None) for idx, score in dense[:top_k]])
+            else:
+                ranked.append(self.fuse(snapshot, query, query_embedding, dense, top_k))
+        return ranked
+    
+    def fuse(self, snapshot: KnowledgeBaseSnapshot, query: str, query_embedding: np.ndarray, dense: List,
+             top_k: int):
+        """Fuse dense and BM25 rankings of one query with RRF."""
+        dense_ids = [idx for idx, _ in dense]
+        sparse_ids, _ = snapshot.bm25.search(query, top_k * FUSION_CANDIDATES)
+        sparse_ids = [int(idx) for idx in sparse_ids]
+        
+        fused = reciprocal_rank_fusion([dense_ids, sparse_ids], k=RRF_K)
+        best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        
+        # Cosine for every fused chunk (keyword-only hits were not scored by the dense index)
+        cosines = dict(dense)
+        missing = [idx for idx in best if idx not in cosines]
+        if missing:
+            cosines.update(zip(missing, (np.asarray(snapshot.embeddings[missing]) @ query_embedding).tolist()))
+        
+        sparse_rank = {idx: rank for rank, idx in enumerate(sparse_ids, start=1)}
+        return [(idx, cosines[idx], (fused[idx], sparse_rank.get(idx))) for idx in best]
+    
+    def format_results(self, snapshot: KnowledgeBaseSnapshot, ranking) -> List[Dict]:
+        """Turn a ranking into result dicts, dropping irrelevant chunks."""
+        results = []
+        for i, (idx, score, fused) in enumerate(ranking):
+            # Only include relevant chunks; exact keyword matches are kept regardless
+            if score > 0.1 or (fused is not None and fused[1] is not None):
+                result = {
+                    'id': idx,
+                    'content': snapshot.chunks[idx],
+                    'metadata': snapshot.metadata[idx],
+                    'score': score,
+                    'rank': i + 1,
+                    'kb_version': snapshot.version
+                }
+                if fused is not None:
+                    result['rrf_score'] = fused[0]
+                    result['bm25_rank'] = fused[1]
+                results.append(result)
+        return results
+    
+    def build_messages(self, query: str, context_chunks: List[Dict]) -> List[Dict]:
+        """Build the chat messages for a query and its retrieved context (within PROMPT_TOKEN_BUDGET)."""
+        return self.context.build_messages(query, context_chunks)
+    
+    @staticmethod
+    def context_version(context_chunks: List[Dict]) -> Optional[str]:
+        """Knowledge base version the chunk ids were retrieved from."""
+        return context_chunks[0].get('kb_version') if context_chunks else None
+    
+    def lookup_cached_answer(self, query: str, context_chunks: List[Dict]):
+        """Return (chunk_ids, query_vector, cached_answer_or_None)."""
+        chunk_ids = [chunk['id'] for chunk in context_chunks]
+        try:
+            query_vector = self.embed_queries([query])[0]
+            cached = self.answer_cache.get(chunk_ids, query_vector, self.context_version(context_chunks))
+            return chunk_ids, query_vector, cached
+        except Exception as e:
+            logger.warning(f"Answer cache lookup skipped: {str(e)}")
+            return chunk_ids, None, None
+    
+    def fallback_response(self, context_chunks: List[Dict]) -> str:
+        """Retrieval-only answer for when the LLM provider is failing: excerpts of the top chunks."""
+        lines = [FALLBACK_INTRO]
+        for chunk in context_chunks:
+            excerpt = ''
+            for sentence in split_sentences(chunk['content']):
+                if excerpt and len(excerpt) + len(sentence) > FALLBACK_EXCERPT_CHARS:
+                    break
+                excerpt = f"{excerpt} {sentence}".strip()
+            if len(excerpt) > FALLBACK_EXCERPT_CHARS:
+                excerpt = excerpt[:FALLBACK_EXCERPT_CHARS].rsplit(' ', 1)[0] + '...'
+            lines.append(f"- {excerpt} ({chunk['metadata']['url']})")
+        return "\n".join(lines)
+    
+    def llm_failure_response(self, error: LLMError, context_chunks: List[Dict]) -> str:
+        metrics.LLM_ERRORS.inc(reason=type(error).__name__ if error.status is None else str(error.status))
+        if error.retryable and context_chunks:
+            # Provider trouble (or open circuit): answer from retrieval alone
+            return self.fallback_response(context_chunks)
+        return ERROR_RESPONSE
     
     def generate_response(self, query: str, context_chunks: List[Dict]) -> str:
         """Generate response using OpenAI GPT with retrieved context."""
-        if not self.openai_client:
-            return "Sorry, I'm having trouble connecting to the AI service. Please try again later."
+        if not self.llm:
+            return NO_SERVICE_RESPONSE
+        
+        with metrics.span('answer_cache'):
+            chunk_ids, query_vector, cached = self.lookup_cached_answer(query, context_chunks)
+        if cached is not None:
+            return cached
         
         try:
-            # Prepare context from retrieved chunks
-            context_text = ""
-            sources = set()
-            
-            for chunk in context_chunks:
-                context_text += f"Content: {chunk['content']}\n"
-                context_text += f"Source: {chunk['metadata']['url']}\n\n"
-                sources.add(chunk['metadata']['url'])
-            
-            # Create the prompt
-            system_prompt = """You are Amal, a compassionate assistant for An-Nisa Hope Center. 
-            You answer questions based only on the provided context from the AnNisa.org website.
+            with metrics.span('prompt'):
+                messages = self.build_messages(query, context_chunks)
             
-            Guidelines:
-            - Only use information from the provided context
-            - If you can't answer based on the context, say so politely
-            - When relevant, include specific page links naturally within your response (e.g., "You can learn more at https://annisa.org/programs")
-            - Be helpful, caring, and informative
-            - Keep responses warm but concise
-            - Don't mention "based on the context" - just answer conversationally
-            - Speak in first person as Amal
-            - Be very caring and compassionate, emphasize hope
-            - Include relevant URLs naturally in your response when they would be helpful
-           """
+            # Call OpenAI API
+            with metrics.span('llm'):
+                completion = self.llm.complete(messages, max_tokens=500, temperature=0.7)
             
-            user_prompt = f"""Context from AnNisa.org:
-            {context_text}
+            answer = completion.text.strip()
+            metrics.LLM_TOKENS.inc(completion.usage.get('prompt_tokens', 0), kind='prompt')
+            metrics.LLM_TOKENS.inc(completion.usage.get('completion_tokens', 0), kind='completion')
             
-            Question: {query}
+            if query_vector is not None:
+                self.answer_cache.put(chunk_ids, query_vector, answer, self.context_version(context_chunks))
             
-            Please answer as Amal, including any relevant page URLs naturally in your response when they would be helpful to the person asking."""
+            return answer
             
-            # Call OpenAI API
-            response = self.openai_client.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
+        except LLMError as e:
+            logger.error(f"Error generating response: {str(e)}")
+            return self.llm_failure_response(e, context_chunks)
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(reason=type(e).__name__)
+            logger.error(f"Error generating response: {str(e)}")
+            return ERROR_RESPONSE
+    
+    def stream_response(self, query: str, context_chunks: List[Dict]) -> Iterator[str]:
+        """Yield the answer as text deltas while OpenAI generates it.
+
+        Raises StreamInterrupted if generation fails after deltas were yielded.
+        """
+        if not self.llm:
+            yield NO_SERVICE_RESPONSE
+            return
+        
+        with metrics.span('answer_cache'):
+            chunk_ids, query_vector, cached = self.lookup_cached_answer(query, context_chunks)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        try:
+            with metrics.span('prompt'):
+                messages = self.build_messages(query, context_chunks)
             
-            answer = response.choices[0].message.content.strip()
+            start = time.perf_counter()
+            for delta in self.llm.stream(messages, max_tokens=500, temperature=0.7):
+                # Streamed events carry no usage; each content delta is one token
+                metrics.LLM_TOKENS.inc(kind='completion')
+                # Leading whitespace is stripped like the non-streaming answer
+                if not parts:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                    metrics.record('llm_first_token', time.perf_counter() - start)
+                parts.append(delta)
+                yield delta
+            metrics.record('llm', time.perf_counter() - start)
             
-            return answer
+            if parts and query_vector is not None:
+                self.answer_cache.put(chunk_ids, query_vector, "".join(parts).strip(),
+                                      self.context_version(context_chunks))
             
+        except LLMError as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            # Only substitute a fallback if nothing has been shown yet
+            failure_response = self.llm_failure_response(e, context_chunks)
+            if parts:
+                raise StreamInterrupted(len(parts)) from e
+            yield failure_response
         except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            return "I'm having some technical difficulties right now. Please try asking your question again, or visit annisa.org for more information."
+            metrics.LLM_ERRORS.inc(reason=type(e).__name__)
+            logger.error(f"Error streaming response: {str(e)}")
+            if parts:
+                raise StreamInterrupted(len(parts)) from e
+            yield ERROR_RESPONSE
 
 # Initialize chatbot
 chatbot = AnNisaChatbot()
 
+# Warm up at import time: with preload_app this happens once in the gunicorn master
+if os.getenv('WARMUP_ON_BOOT', '1').lower() not in ('0', 'false', 'no'):
+    chatbot.warm_up()
+    # Keep the garbage collector from touching (and un-sharing) preloaded objects after fork
+    gc.freeze()
+else:
+    # Lazy mode: the model loads on the first query, as before
+    chatbot.ready = True
+
+# Workers pick up newly published knowledge base versions on their own
+chatbot.watcher = KnowledgeBaseWatcher(chatbot.reload_knowledge_base, interval=KB_RELOAD_INTERVAL)
+
+# Cache, batcher and knowledge base figures, read from their stats at scrape time
+metrics.REGISTRY.gauge_callback(
+    'annisa_query_cache_lookups_total', 'Query embedding cache lookups by result',
+    lambda: {'hit': chatbot.query_cache.hits, 'miss': chatbot.query_cache.misses}, kind='counter', label='result')
+metrics.REGISTRY.gauge_callback(
+    'annisa_answer_cache_lookups_total', 'Semantic answer cache lookups by result',
+    lambda: {'hit': chatbot.answer_cache.hits, 'miss': chatbot.answer_cache.misses}, kind='counter', label='result')
+metrics.REGISTRY.gauge_callback(
+    'annisa_encoder_batches_total', 'Micro-batched encoder forward passes',
+    lambda: chatbot.encoder.batches, kind='counter')
+metrics.REGISTRY.gauge_callback(
+    'annisa_encoder_batched_queries_total', 'Queries encoded through the micro-batcher',
+    lambda: chatbot.encoder.items, kind='counter')
+metrics.REGISTRY.gauge_callback(
+    'annisa_llm_circuit_open', '1 while the LLM circuit breaker refuses calls',
+    lambda: int(chatbot.llm is not None and chatbot.llm.breaker.state == 'open'))
+metrics.REGISTRY.gauge_callback(
+    'annisa_knowledge_base_chunks', 'Chunks in the loaded knowledge base',
+    lambda: len(chatbot.snapshot))
+
+@app.before_request
+def start_watcher():
+    # Started lazily so the thread lives in each worker, not the preloading master
+    chatbot.watcher.ensure_started()
+
+@app.before_request
+def start_timing():
+    if metrics.METRICS_ENABLED:
+        g.request_start = time.perf_counter()
+        metrics.begin_request()
+
+@app.after_request
+def record_timing(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    # For /chat/stream this is the time until the stream starts; its stages are still recorded
+    endpoint = request.endpoint or 'unknown'
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    metrics.REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    timings = metrics.end_request()
+    if timings and (TIMING_HEADER or 'X-Timing' in request.headers):
+        response.headers['X-Timing'] = metrics.timing_header(timings)
+    return response
+
 @app.route('/', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
+    """Health check endpoint; reports 503 until warm-up has completed."""
+    if not chatbot.ready:
+        return jsonify({
+            'status': 'warming_up',
+            'service': 'AnNisa Chatbot API'
+        }), 503
+    
     return jsonify({
         'status': 'healthy',
         'service': 'AnNisa Chatbot API',
-        'knowledge_base_loaded': len(chatbot.chunks) > 0,
-        'chunks_count': len(chatbot.chunks)
+        'knowledge_base_loaded': len(chatbot.snapshot) > 0,
+        'kb_version': chatbot.snapshot.version,
+        'chunks_count': len(chatbot.snapshot),
+        'query_cache': chatbot.query_cache.stats(),
+        'answer_cache': chatbot.answer_cache.stats(),
+        'encoder_batcher': chatbot.encoder.stats(),
+        'llm': chatbot.llm.stats() if chatbot.llm else None
     })
 
 @app.route('/chat', methods=['POST'])
@@ -211,7 +591,7 @@ def chat():
         
         if not relevant_chunks:
             return jsonify({
-                'response': "I don't have specific information about that topic. For the most up-to-date details, I'd recommend visiting annisa.org directly or reaching out to them - they'll be happy to help!"
+                'response': NO_INFO_RESPONSE
             })
         
         # Generate response
@@ -226,6 +606,56 @@ def chat():
         logger.error(f"Error in chat endpoint: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming chat endpoint: retrieval metadata first, then answer deltas as SSE."""
+    data = request.get_json(silent=True)
+    
+    if not data or 'message' not in data:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    user_message = data['message'].strip()
+    
+    if not user_message:
+        return jsonify({'error': 'Empty message'}), 400
+    
+    logger.info(f"Received streaming query: {user_message}")
+    
+    def generate():
+        try:
+            relevant_chunks = chatbot.search_knowledge_base(user_message, top_k=3)
+            
+            yield sse_event('meta', {
+                'chunks_used': len(relevant_chunks),
+                'sources': list(dict.fromkeys(chunk['metadata']['url'] for chunk in relevant_chunks))
+            })
+            
+            if not relevant_chunks:
+                yield sse_event('delta', {'content': NO_INFO_RESPONSE})
+            else:
+                for delta in chatbot.stream_response(user_message, relevant_chunks):
+                    yield sse_event('delta', {'content': delta})
+            
+            yield sse_event('done', {})
+            
+        except StreamInterrupted as e:
+            # Part of the answer was sent: an error frame (not "done") marks it as truncated
+            logger.error(f"Chat stream interrupted after {e.deltas} deltas")
+            yield sse_event('error', {'error': 'The answer was interrupted', 'partial': True})
+        except Exception as e:
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield sse_event('error', {'error': 'Internal server error'})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop reverse proxies from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/search', methods=['POST'])
 def search():
     """Search endpoint for debugging."""
@@ -247,9 +677,57 @@ def search():
         logger.error(f"Error in search endpoint: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """Batch search for offline evaluation and cache pre-warming."""
+    try:
+        data = request.get_json(silent=True) or {}
+        queries = data.get('queries')
+        
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'error': 'No queries provided'}), 400
+        if len(queries) > SEARCH_BATCH_MAX:
+            return jsonify({'error': f'At most {SEARCH_BATCH_MAX} queries per request'}), 400
+        if not all(isinstance(query, str) and query.strip() for query in queries):
+            return jsonify({'error': 'Queries must be non-empty strings'}), 400
+        
+        top_k = min(max(int(data.get('top_k', 5)), 1), 50)
+        results = chatbot.search_batch([query.strip() for query in queries], top_k=top_k)
+        
+        return jsonify({
+            'results': [{'query': query, 'results': chunks} for query, chunks in zip(queries, results)]
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in batch search endpoint: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage latency histograms and counters in the Prometheus text format (this worker only)."""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({'error': 'Not found'}), 404
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Swap in the current knowledge base version now instead of at the next watcher poll."""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        return jsonify(chatbot.reload_knowledge_base(force=bool(data.get('force', False))))
+        
+    except Exception as e:
+        logger.error(f"Error reloading knowledge base: {str(e)}")
+        return jsonify({'error': 'Reload failed', 'kb_version': chatbot.snapshot.version}), 500
+
 if __name__ == '__main__':
     # Check if knowledge base exists
-    if not os.path.exists("data/knowledge_base.pkl"):
+    if not knowledge_base_exists():
         print("❌ Knowledge base not found!")
         print("Please run 'python ingest.py' first to create the knowledge base.")
         exit(1)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Micro-batching of concurrent query encodes.
+
+Each request used to call SentenceTransformer.encode on a single string. The
+MicroBatcher collects texts that arrive within a short window (or until
+`max_batch` are waiting), encodes them in one batched forward pass and hands
+each caller its own row back.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from concurrency import run_cpu_bound
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class MicroBatcher:
+    """Coalesce encode calls from many threads into batched encode_fn calls."""
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 window_ms: float = 5.0, max_batch: int = 32):
+        self.encode_fn = encode_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+        self.histogram = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self.histogram_overflow = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_batch > 1
+
+    def _ensure_thread(self):
+        """Start the collector thread lazily, once per process (threads don't survive fork)."""
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='encode-batcher', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def encode(self, texts: List[str], timeout: float = 30.0) -> np.ndarray:
+        """Encode texts, sharing a forward pass with concurrent callers."""
+        if not self.enabled:
+            return np.asarray(run_cpu_bound(self.encode_fn, list(texts)))
+        self._ensure_thread()
+        now = time.perf_counter()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future, now))
+            futures.append(future)
+        return np.vstack([future.result(timeout=timeout) for future in futures])
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            vectors = np.asarray(run_cpu_bound(self.encode_fn, [text for text, _, _ in batch]))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for row, (_, future, _) in enumerate(batch):
+            future.set_result(vectors[row])
+        self._record(len(batch), [started - enqueued for _, _, enqueued in batch])
+
+    def _record(self, size: int, delays: List[float]):
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            self.total_queue_delay += sum(delays)
+            self.max_queue_delay = max(self.max_queue_delay, max(delays))
+            for bound in BATCH_SIZE_BUCKETS:
+                if size <= bound:
+                    self.histogram[bound] += 1
+                    break
+            else:
+                self.histogram_overflow += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            histogram = {f"<={bound}": count for bound, count in self.histogram.items()}
+            histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = self.histogram_overflow
+            return {
+                "enabled": self.enabled,
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_size_histogram": histogram,
+                "mean_queue_delay_ms": round(self.total_queue_delay / self.items * 1000, 3) if self.items else 0.0,
+                "max_queue_delay_ms": round(self.max_queue_delay * 1000, 3),
+            }
@@ -0,0 +1 @@
+"""Benchmarks for the AnNisa.org chatbot backend. Run from backend/ with `python -m bench.<name>`."""
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Shared helpers for the benchmarks: latency percentiles, RSS and JSON results."""
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+def latency_summary(seconds: Iterable[float]) -> Dict:
+    """Count, mean and p50/p95/p99/max of latencies given in seconds, reported in ms."""
+    samples = np.asarray(list(seconds), dtype=np.float64) * 1000
+    if samples.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"count": int(samples.size), "mean_ms": round(float(samples.mean()), 3),
+            "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "max_ms": round(float(samples.max()), 3)}
+
+
+def rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Current resident set size of a process (this one by default), from /proc."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def tree_rss_mb(pid: int) -> Optional[float]:
+    """RSS of a process plus its children (a gunicorn master and its workers)."""
+    total = rss_mb(pid)
+    if total is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    return total + sum(tree_rss_mb(child) or 0.0 for child in children)
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def environment() -> Dict:
+    """Machine and revision details so results from different runs can be compared."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "git_commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__}
+
+
+def write_results(path: str, benchmark: str, config: Dict, results: List[Dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": benchmark, "environment": environment(), "config": config,
+                   "results": results}, f, indent=2)
+    print(f"💾 Results written to {path}")
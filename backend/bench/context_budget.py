@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Prompt-token benchmark: ContextAssembler vs the previous verbatim prompt.
+
+Retrieves the top-k chunks for a set of questions from the current knowledge
+base, builds both prompts and reports their token counts. Coverage is the
+share of each question's most query-similar sentences by embedding (from all
+retrieved chunks) that survive in the assembled context, as a proxy for
+recall; the assembler itself only uses term overlap:
+
+    python -m bench.context_budget
+    python -m bench.context_budget --budget 700 --top-k 5 --json context.json
+"""
+
+import argparse
+
+import numpy as np
+
+from bench.common import write_results
+from bench.micro import QUERIES, load_encoder
+from chunker import split_sentences
+from context import ContextAssembler, count_tokens
+from kb_store import open_knowledge_base
+from retrieval import normalize_rows
+from vector_index import FlatIndex
+
+MORE_QUERIES = [
+    "How can I get involved as a volunteer?",
+    "Who can receive help from An-Nisa Hope Center?",
+    "Is there support for domestic violence survivors?",
+    "How do I contact An-Nisa?",
+    "What programs do you run for children?",
+    "Can I make a monthly donation?",
+]
+
+LEGACY_SYSTEM_PROMPT = """You are Amal, a compassionate assistant for An-Nisa Hope Center.
+        You answer questions based only on the provided context from the AnNisa.org website.
+
+        Guidelines:
+        - Only use information from the provided context
+        - If you can't answer based on the context, say so politely
+        - When relevant, include specific page links naturally within your response (e.g., "You can learn more at https://annisa.org/programs")
+        - Be helpful, caring, and informative
+        - Keep responses warm but concise
+        - Don't mention "based on the context" - just answer conversationally
+        - Speak in first person as Amal
+        - Be very caring and compassionate, emphasize hope
+        - Include relevant URLs naturally in your response when they would be helpful
+       """
+
+
+def legacy_prompt_tokens(query: str, chunks) -> int:
+    """Tokens of the prompt app.py sent before ContextAssembler."""
+    context_text = ""
+    for chunk in chunks:
+        context_text += f"Content: {chunk['content']}\n"
+        context_text += f"Source: {chunk['metadata']['url']}\n\n"
+    user_prompt = f"""Context from AnNisa.org:
+        {context_text}
+
+        Question: {query}
+
+        Please answer as Amal, including any relevant page URLs naturally in your response when they would be helpful to the person asking."""
+    return count_tokens(LEGACY_SYSTEM_PROMPT) + count_tokens(user_prompt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=900, help="PROMPT_TOKEN_BUDGET")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--coverage-n", type=int, default=3, help="most query-similar sentences checked per query")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    store = open_knowledge_base()
+    encoder = load_encoder()
+    encode = lambda texts: normalize_rows(encoder.encode(texts, batch_size=max(len(texts), 1)))
+    assembler = ContextAssembler(args.budget)
+    index = FlatIndex(np.asarray(store.embeddings))
+
+    queries = QUERIES + MORE_QUERIES
+    query_vectors = encode(queries)
+    ids, scores = index.search(query_vectors, args.top_k)
+
+    results = []
+    for query, query_vector, row_ids, row_scores in zip(queries, query_vectors, ids, scores):
+        chunks = [{'id': int(i), 'content': store.chunks[int(i)], 'metadata': store.metadata[int(i)],
+                   'score': float(s)} for i, s in zip(row_ids, row_scores) if i >= 0]
+        before = legacy_prompt_tokens(query, chunks)
+        messages = assembler.build_messages(query, chunks)
+        after = sum(count_tokens(message['content']) for message in messages)
+
+        sentences = list(dict.fromkeys(s for chunk in chunks for s in split_sentences(chunk['content'])))
+        best = np.argsort(-(encode(sentences) @ query_vector))[:args.coverage_n] if sentences else []
+        context = ' '.join(' '.join(message['content'].split()) for message in messages)
+        covered = sum(' '.join(sentences[i].split()) in context for i in best)
+        results.append({"query": query, "tokens_before": before, "tokens_after": after,
+                        "coverage": covered / len(best) if len(best) else 1.0})
+
+    before = np.mean([r["tokens_before"] for r in results])
+    after = np.mean([r["tokens_after"] for r in results])
+    coverage = np.mean([r["coverage"] for r in results])
+    print(f"📚 {len(store.chunks)} chunks, {len(queries)} queries, top_k={args.top_k}, budget={args.budget}")
+    print(f"🔢 Prompt tokens per request: {before:.0f} -> {after:.0f} ({(1 - after / before) * 100:.0f}% fewer)")
+    print(f"🎯 Top-{args.coverage_n} sentence coverage: {coverage * 100:.0f}%")
+    if args.json:
+        summary = {"query": "mean", "tokens_before": float(before), "tokens_after": float(after),
+                   "coverage": float(coverage)}
+        write_results(args.json, "context_budget", vars(args), results + [summary])
+
+
+if __name__ == "__main__":
+    main()
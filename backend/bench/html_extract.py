@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Parse-time benchmark: lxml extractor vs the previous BeautifulSoup path.
+
+Runs both extractors over saved HTML pages (bench/fixtures by default) and
+reports ms/page, the speedup and how much of the old text the new one keeps:
+
+    python -m bench.html_extract --repeat 20
+    python -m bench.html_extract --fetch https://annisa.org --dir /tmp/annisa-pages
+    python -m bench.html_extract --dir /tmp/annisa-pages --json results.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+from html_extract import extract_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def legacy_extract(content: bytes) -> str:
+    """The extraction ingest.py used before html_extract (html.parser + decompose + select_one)."""
+    soup = BeautifulSoup(content, 'html.parser')
+    for script in soup(["script", "style", "nav", "footer", "header"]):
+        script.decompose()
+    for selector in ['main', 'article', '.content', '#content', '.main-content', '.page-content', 'section']:
+        content_elem = soup.select_one(selector)
+        if content_elem:
+            return content_elem.get_text()
+    return soup.body.get_text() if soup.body else soup.get_text()
+
+
+def time_per_page(fn, pages, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content in pages:
+            fn(content)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(pages))
+
+
+def word_recall(old: str, new: str) -> float:
+    """Fraction of the old extractor's distinct words that the new one also returns.
+
+    get_text() glued adjacent blocks ("TitleFirst"), so values a little
+    below 1 are expected even when no content is lost.
+    """
+    old_words = set(re.findall(r'\w+', old.lower()))
+    new_words = set(re.findall(r'\w+', new.lower()))
+    return len(old_words & new_words) / len(old_words) if old_words else 1.0
+
+
+def fetch_pages(base_url: str, directory: str, max_pages: int):
+    """Save crawled pages as fixtures."""
+    from crawler import Crawler
+
+    os.makedirs(directory, exist_ok=True)
+    crawler = Crawler()
+    saved = 0
+    for result in crawler.crawl([base_url], max_pages=max_pages):
+        if result['error'] or not result['content']:
+            continue
+        name = re.sub(r'[^\w.-]+', '_', result['url'].split('://', 1)[-1]).strip('_') or 'index'
+        with open(os.path.join(directory, name + '.html'), 'wb') as f:
+            f.write(result['content'])
+        saved += 1
+    crawler.close()
+    print(f"💾 Saved {saved} pages to {directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=FIXTURES_DIR, help='directory of saved .html pages')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--fetch', metavar='BASE_URL', help='crawl a site into --dir first')
+    parser.add_argument('--max-pages', type=int, default=50)
+    parser.add_argument('--json', help='write machine-readable results to this file')
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_pages(args.fetch, args.dir, args.max_pages)
+
+    paths = sorted(glob.glob(os.path.join(args.dir, '*.html')))
+    if not paths:
+        parser.error(f"no .html files in {args.dir}")
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+
+    legacy_ms = time_per_page(legacy_extract, pages, args.repeat)
+    lxml_ms = time_per_page(extract_page, pages, args.repeat)
+    recall = [word_recall(legacy_extract(content), extract_page(content)['text']) for content in pages]
+
+    total_kb = sum(len(content) for content in pages) / 1024
+    print(f"{len(pages)} pages, {total_kb:.0f} KB, {args.repeat} repeats")
+    print(f"{'extractor':<24} {'ms/page':>10}")
+    print(f"{'bs4 html.parser':<24} {legacy_ms:>10.2f}")
+    print(f"{'lxml (html_extract)':<24} {lxml_ms:>10.2f}")
+    print(f"speedup: {legacy_ms / lxml_ms:.1f}x, word recall vs old text: min {min(recall):.3f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'pages': len(pages),
+                'kb': round(total_kb, 1),
+                'repeat': args.repeat,
+                'legacy_ms_per_page': legacy_ms,
+                'lxml_ms_per_page': lxml_ms,
+                'speedup': legacy_ms / lxml_ms,
+                'word_recall': dict(zip((os.path.basename(p) for p in paths), recall)),
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Recall/latency benchmark for the vector index backends.
+
+Compares IVF, HNSW and compressed (sq8/pq) settings against the exact flat
+scan on either the current knowledge base or a synthetic clustered corpus:
+
+    python -m bench.index_recall --synthetic 20000 --k 5
+    python -m bench.index_recall --store --json results.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from kb_store import open_knowledge_base
+from retrieval import normalize_rows
+from vector_index import FlatIndex, build_index
+
+
+def synthetic_corpus(n: int, dim: int = 384, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real sentence embeddings than pure noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return normalize_rows(centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def time_search(index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    ids, _ = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    return ids, elapsed * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", action="store_true", help="use the current knowledge base embeddings")
+    parser.add_argument("--synthetic", type=int, default=10000, help="synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--pq-m", type=int, default=0, help="PQ sub-quantizers (default dim/4)")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    if args.store:
+        vectors = np.asarray(open_knowledge_base().embeddings)
+    else:
+        vectors = synthetic_corpus(args.synthetic)
+    rng = np.random.default_rng(1)
+    # Perturbed corpus rows stand in for real queries
+    queries = normalize_rows(vectors[rng.integers(0, len(vectors), args.queries)]
+                             + 0.3 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32))
+
+    print(f"📐 Corpus: {vectors.shape[0]} x {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    truth, flat_ms = time_search(FlatIndex(vectors), queries, args.k)
+    results = [{"index": "flat", "params": {}, "build_s": 0.0, "recall": 1.0, "ms_per_query": flat_ms,
+                "vector_mb": vectors.nbytes / 1e6}]
+
+    for kind, knob, values, build_params in (
+        ("ivf", "nprobe", args.nprobe, {}),
+        ("hnsw", "ef_search", args.ef_search, {"M": args.hnsw_m}),
+        ("sq8", "rerank", args.rerank, {}),
+        ("pq", "rerank", args.rerank, {"m": args.pq_m or None}),
+    ):
+        start = time.perf_counter()
+        index = build_index(kind, vectors, **build_params)
+        build_s = time.perf_counter() - start
+        # Resident vector bytes: compressed codes, or the full matrix for uncompressed indexes
+        quantizer = getattr(index, "quantizer", None)
+        vector_mb = (quantizer.codes.nbytes if quantizer is not None else vectors.nbytes) / 1e6
+        for value in values:
+            index.set_params(**{knob: value})
+            ids, ms = time_search(index, queries, args.k)
+            results.append({"index": kind, "params": dict(index.params), "build_s": build_s,
+                            "recall": recall_at_k(ids, truth), "ms_per_query": ms, "vector_mb": vector_mb})
+
+    print(f"{'index':<6} {'params':<48} {'build s':>8} {f'recall@{args.k}':>9} {'ms/query':>9} {'vec MB':>8}")
+    for r in results:
+        print(f"{r['index']:<6} {json.dumps(r['params']):<48} {r['build_s']:>8.2f} "
+              f"{r['recall']:>9.3f} {r['ms_per_query']:>9.3f} {r['vector_mb']:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"corpus": list(vectors.shape), "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat completions API with configurable latency.
+
+Load tests against /chat should measure this service, not OpenAI's queueing
+or bill. Point the app at the stub and it answers every completion with a
+canned reply after `--latency-ms` (plus uniform `--jitter-ms`), streaming
+`--tokens` deltas `--token-ms` apart when `stream` is requested:
+
+    python -m bench.llm_stub --port 8089 --latency-ms 800 --token-ms 20
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub gunicorn -c gunicorn.conf.py app:app
+
+`--error-rate` makes that fraction of calls fail with a 500 (or 429 with
+`--error-status 429`) to exercise error handling.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = ("An-Nisa offers volunteer opportunities, counseling and emergency financial assistance "
+               "for women and families. Visit annisa.org or contact the office for details.").split()
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 500, jitter_ms: float = 0, tokens: int = 60, token_ms: float = 0,
+                 error_rate: float = 0.0, error_status: int = 500):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens = tokens
+        self.token_ms = token_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def first_token_delay(self) -> float:
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+
+def reply_tokens(count: int):
+    return [(' ' if i else '') + REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(count)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        try:
+            self.complete()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (deadline, or the losing side of a hedged request)
+            self.close_connection = True
+
+    def complete(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self.send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+
+        config = self.config
+        config.count_call()
+        time.sleep(config.first_token_delay())
+        if random.random() < config.error_rate:
+            return self.send_json(config.error_status, {'error': {'message': 'stub failure', 'type': 'server_error'}})
+
+        tokens = reply_tokens(config.tokens)
+        model = body.get('model', 'stub')
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+        if body.get('stream'):
+            return self.stream(model, tokens)
+
+        time.sleep(config.token_ms * len(tokens) / 1000)
+        self.send_json(200, {
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                      'total_tokens': prompt_tokens + len(tokens)},
+        })
+
+    def stream(self, model: str, tokens):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for i, token in enumerate(tokens + [None]):
+            if i and self.config.token_ms:
+                time.sleep(self.config.token_ms / 1000)
+            delta = {'content': token} if token is not None else {}
+            event = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': [{'index': 0, 'delta': delta,
+                                                  'finish_reason': None if token is not None else 'stop'}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def send_json(self, status: int, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub(config: StubConfig, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub on a daemon thread; port 0 picks a free port (see server.server_address)."""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='llm-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=500, help="delay before the first token")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="extra uniform random delay")
+    parser.add_argument("--tokens", type=int, default=60, help="tokens per reply")
+    parser.add_argument("--token-ms", type=float, default=0, help="delay between tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.tokens, args.token_ms, args.error_rate,
+                        args.error_status)
+    server = start_stub(config, args.host, args.port)
+    print(f"🤖 LLM stub on http://{args.host}:{server.server_address[1]}/v1 "
+          f"({args.latency_ms:.0f} ms +{args.jitter_ms:.0f} ms, {args.tokens} tokens)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Flask API: concurrent /chat, /chat/stream and /search traffic.
+
+By default it starts the LLM stub (bench.llm_stub) and the app under gunicorn
+with OPENAI_API_BASE pointed at the stub, so only this service is measured:
+
+    python -m bench.load --concurrency 32 --duration 30
+    python -m bench.load --mix chat=1 search=3 stream=1 --llm-latency-ms 1200 --json load.json
+    python -m bench.load --url http://localhost:5001     # an already running server
+
+Each of `--concurrency` clients sends requests back to back for `--duration`
+seconds. Reports p50/p95/p99 latency and requests/s per endpoint, the
+server's RSS (when started here) and its per-stage timings from /metrics.
+"""
+
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from bench.common import latency_summary, rss_mb, tree_rss_mb, write_results
+from bench.llm_stub import StubConfig, start_stub
+from bench.micro import QUERIES
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {
+    'chat': ('/chat', lambda query: {'message': query}),
+    'stream': ('/chat/stream', lambda query: {'message': query}),
+    'search': ('/search', lambda query: {'query': query}),
+}
+# /chat/stream reports failures after its 200 status line, as an SSE error frame
+SSE_ERROR = b'\nevent: error'
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(url + '/', timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} not healthy after {timeout:.0f}s")
+
+
+def start_server(port: int, llm_base: str, workers: int, threads: int, log_path: str) -> subprocess.Popen:
+    env = dict(os.environ, PORT=str(port), OPENAI_API_BASE=llm_base,
+               OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY', 'stub'),
+               WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads))
+    with open(log_path, 'wb') as log:
+        return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                                cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def send(session: requests.Session, url: str, endpoint: str, query: str, timeout: float):
+    """One request; returns (ok, seconds, seconds to first byte).
+
+    A stream that carries an `event: error` frame counts as a failure.
+    """
+    path, payload = ENDPOINTS[endpoint]
+    start = time.perf_counter()
+    try:
+        with session.post(url + path, json=payload(query), timeout=timeout, stream=True) as response:
+            ok = response.status_code == 200
+            first_byte = None
+            # Bytes carried over so a frame split across chunks is still found
+            tail = b'\n'
+            for chunk in response.iter_content(chunk_size=None):
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                window = tail + chunk
+                if SSE_ERROR in window:
+                    ok = False
+                tail = window[-(len(SSE_ERROR) - 1):]
+            elapsed = time.perf_counter() - start
+            return ok, elapsed, first_byte or elapsed
+    except requests.RequestException:
+        elapsed = time.perf_counter() - start
+        return False, elapsed, elapsed
+
+
+def run_load(url: str, mix: Dict[str, float], concurrency: int, duration: float, timeout: float):
+    endpoints = list(mix)
+    weights = [mix[endpoint] for endpoint in endpoints]
+    latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in endpoints}
+    first_bytes: Dict[str, List[float]] = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: 0 for endpoint in endpoints}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(seed: int):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            # A numbered suffix on some queries keeps the caches from answering everything
+            query = rng.choice(QUERIES) + (f" ({rng.randint(1, 50)})" if rng.random() < 0.5 else '')
+            ok, elapsed, first_byte = send(session, url, endpoint, query, timeout)
+            with lock:
+                if ok:
+                    latencies[endpoint].append(elapsed)
+                    first_bytes[endpoint].append(first_byte)
+                else:
+                    errors[endpoint] += 1
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = []
+    for endpoint in endpoints:
+        summary = latency_summary(latencies[endpoint])
+        row = {"endpoint": ENDPOINTS[endpoint][0], **summary, "errors": errors[endpoint],
+               "rps": round(len(latencies[endpoint]) / elapsed, 2)}
+        if endpoint == 'stream':
+            row["first_byte"] = latency_summary(first_bytes[endpoint])
+        results.append(row)
+    return results, elapsed
+
+
+def stage_timings(url: str) -> Dict[str, Dict]:
+    """Mean per-stage latency from the server's /metrics (the worker that answers the scrape)."""
+    try:
+        text = requests.get(url + '/metrics', timeout=5).text
+    except requests.RequestException:
+        return {}
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        for suffix, target in (('_sum', sums), ('_count', counts)):
+            prefix = f'annisa_stage_seconds{suffix}{{stage="'
+            if line.startswith(prefix):
+                stage, value = line[len(prefix):].split('"} ')
+                target[stage] = float(value)
+    return {stage: {"count": int(counts.get(stage, 0)),
+                    "mean_ms": round(sums[stage] * 1000 / counts[stage], 3) if counts.get(stage) else None}
+            for stage in sums}
+
+
+def parse_mix(items: List[str]) -> Dict[str, float]:
+    mix = {}
+    for item in items:
+        endpoint, _, weight = item.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {endpoint!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[endpoint] = float(weight or 1)
+    return {endpoint: weight for endpoint, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--mix", nargs="+", default=["chat=1", "search=3"],
+                        help="endpoint=weight pairs (chat, stream, search)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unrecorded load first")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers when starting the server")
+    parser.add_argument("--threads", type=int, default=32, help="gunicorn threads per worker")
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--llm-token-ms", type=float, default=10)
+    parser.add_argument("--boot-timeout", type=float, default=180)
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "annisa-bench-server.log"),
+                        help="gunicorn output when starting the server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    server = stub = None
+    url = args.url.rstrip('/') if args.url else None
+    if url is None:
+        stub_config = StubConfig(args.llm_latency_ms, args.llm_jitter_ms, args.llm_tokens, args.llm_token_ms)
+        stub = start_stub(stub_config)
+        llm_base = f"http://127.0.0.1:{stub.server_address[1]}/v1"
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        print(f"🤖 LLM stub at {llm_base}; starting gunicorn on port {port} (log: {args.server_log})")
+        server = start_server(port, llm_base, args.workers, args.threads, args.server_log)
+
+    peak_server_rss = [None]
+    sampling = threading.Event()
+
+    def sample_rss():
+        while not sampling.wait(0.5):
+            rss = tree_rss_mb(server.pid)
+            if rss is not None:
+                peak_server_rss[0] = max(peak_server_rss[0] or 0.0, rss)
+
+    try:
+        wait_healthy(url, args.boot_timeout, server)
+        if server is not None:
+            threading.Thread(target=sample_rss, daemon=True).start()
+        if args.warmup:
+            run_load(url, mix, args.concurrency, args.warmup, args.timeout)
+
+        print(f"🚦 {args.concurrency} clients for {args.duration:.0f}s, mix {mix}")
+        results, elapsed = run_load(url, mix, args.concurrency, args.duration, args.timeout)
+        stages = stage_timings(url)
+        server_rss = tree_rss_mb(server.pid) if server is not None else None
+    finally:
+        sampling.set()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if stub is not None:
+            stub.shutdown()
+
+    total = sum(row.get("count", 0) for row in results)
+    for row in results:
+        if row.get("count"):
+            print(f"  {row['endpoint']:<13} {row['rps']:>7.1f} req/s  p50 {row['p50_ms']:.1f} ms  "
+                  f"p95 {row['p95_ms']:.1f} ms  p99 {row['p99_ms']:.1f} ms  errors {row['errors']}")
+        else:
+            print(f"  {row['endpoint']:<13} no successful requests, errors {row['errors']}")
+    print(f"📊 {total / elapsed:.1f} req/s overall")
+    for stage, timing in stages.items():
+        print(f"  stage {stage:<16} mean {timing['mean_ms']} ms over {timing['count']}")
+    if server_rss is not None:
+        print(f"🧠 Server RSS {server_rss:.0f} MB (peak {peak_server_rss[0] or server_rss:.0f} MB)")
+
+    if args.json:
+        summary = {"endpoint": "all", "count": total, "rps": round(total / elapsed, 2),
+                   "server_rss_mb": server_rss, "server_peak_rss_mb": peak_server_rss[0],
+                   "client_rss_mb": rss_mb(), "stages": stages}
+        write_results(args.json, "load", vars(args), results + [summary])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the query path and ingest chunking.
+
+- encode:  query encoder latency per batch size (SentenceTransformer, or ONNX with ENCODER_BACKEND=onnx)
+- search:  exact flat scan over synthetic corpora of increasing size, one query and a batch of queries
+- bm25:    keyword scoring over synthetic documents of the same sizes
+- chunk:   TokenChunker over the bundled HTML fixtures
+
+    python -m bench.micro
+    python -m bench.micro --sizes 1000 10000 100000 1000000 --only search
+    python -m bench.micro --json micro.json
+
+A million 384-d float32 vectors take about 1.5 GB; BM25 corpora are capped by
+--bm25-max-size because building them is pure Python.
+"""
+
+import argparse
+import glob
+import itertools
+import os
+import time
+
+import numpy as np
+
+from bench.common import latency_summary, peak_rss_mb, rss_mb, write_results
+from bench.index_recall import synthetic_corpus
+from retrieval import normalize_rows
+from sparse_index import BM25Index
+from vector_index import FlatIndex
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+MODEL_NAME = 'paraphrase-MiniLM-L3-v2'
+QUERIES = [
+    "How can I volunteer with An-Nisa?",
+    "What does the ECRF program cover?",
+    "Where do I donate zakat?",
+    "Do you offer counseling for women?",
+    "How do I apply for emergency financial help?",
+    "What events are coming up this month?",
+]
+
+
+def load_encoder():
+    """The query encoder app.py would load (without importing the app)."""
+    if os.getenv('ENCODER_BACKEND', 'torch') == 'onnx':
+        from onnx_encoder import OnnxEncoder
+        return OnnxEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME, device='cpu')
+
+
+def timed(fn, repeat: int, warmup: int = 2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def synthetic_documents(n: int, words_per_doc: int = 60, vocabulary: int = 20000, seed: int = 0):
+    """Zipf-distributed word ids rendered as text, roughly the term statistics of real pages."""
+    rng = np.random.default_rng(seed)
+    ids = np.minimum(rng.zipf(1.2, (n, words_per_doc)), vocabulary)
+    return [' '.join(f"w{i}" for i in row) for row in ids]
+
+
+def bench_encode(encoder, batch_sizes, repeat):
+    results = []
+    for batch in batch_sizes:
+        texts = [QUERIES[i % len(QUERIES)] + f" #{i}" for i in range(batch)]
+        samples = timed(lambda: encoder.encode(texts, batch_size=batch), repeat)
+        summary = latency_summary(samples)
+        results.append({"bench": "encode", "batch": batch, **summary,
+                        "queries_per_s": round(batch / float(np.mean(samples)), 1)})
+        print(f"  encode batch={batch:<4} p50 {summary['p50_ms']:.2f} ms  p99 {summary['p99_ms']:.2f} ms")
+    return results
+
+
+def bench_search(sizes, batch_sizes, k, repeat):
+    results = []
+    for size in sizes:
+        vectors = synthetic_corpus(size)
+        index = FlatIndex(vectors)
+        rng = np.random.default_rng(1)
+        for batch in batch_sizes:
+            queries = normalize_rows(vectors[rng.integers(0, size, batch)]
+                                     + 0.3 * rng.standard_normal((batch, vectors.shape[1])).astype(np.float32))
+            summary = latency_summary(timed(lambda: index.search(queries, k), repeat))
+            results.append({"bench": "search", "index": "flat", "size": size, "batch": batch, "k": k, **summary,
+                            "rss_mb": rss_mb()})
+            print(f"  search size={size:<8} batch={batch:<3} p50 {summary['p50_ms']:.2f} ms  "
+                  f"p99 {summary['p99_ms']:.2f} ms")
+        del index, vectors
+    return results
+
+
+def bench_bm25(sizes, k, repeat):
+    results = []
+    for size in sizes:
+        documents = synthetic_documents(size)
+        start = time.perf_counter()
+        index = BM25Index.build(documents)
+        build_s = time.perf_counter() - start
+        queries = [' '.join(documents[i].split()[:4]) for i in range(0, size, max(size // 16, 1))][:16]
+        cycle = itertools.cycle(queries)
+        samples = timed(lambda: index.search(next(cycle), k), repeat)
+        summary = latency_summary(samples)
+        results.append({"bench": "bm25", "size": size, "k": k, "build_s": round(build_s, 3), **summary})
+        print(f"  bm25   size={size:<8} build {build_s:.2f}s  p50 {summary['p50_ms']:.2f} ms  "
+              f"p99 {summary['p99_ms']:.2f} ms")
+        del index, documents
+    return results
+
+
+def bench_chunk(tokenizer, max_tokens, repeat):
+    from chunker import TokenChunker
+    from html_extract import extract_page
+
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, 'rb') as f:
+            pages.append(extract_page(f.read(), path)['blocks'])
+    chunker = TokenChunker(tokenizer, max_tokens=max_tokens)
+    chunk_count = sum(len(chunker.chunk_blocks(blocks)) for blocks in pages)
+    samples = timed(lambda: [chunker.chunk_blocks(blocks) for blocks in pages], repeat)
+    summary = latency_summary(np.asarray(samples) / max(len(pages), 1))
+    print(f"  chunk  {len(pages)} pages -> {chunk_count} chunks  p50 {summary['p50_ms']:.2f} ms/page")
+    return [{"bench": "chunk", "pages": len(pages), "chunks": chunk_count, "max_tokens": max_tokens,
+             "unit": "per_page", **summary}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=["encode", "search", "bm25", "chunk"],
+                        default=["encode", "search", "bm25", "chunk"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--encode-batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--bm25-max-size", type=int, default=100000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    encoder = None
+    if "encode" in args.only or "chunk" in args.only:
+        try:
+            encoder = load_encoder()
+        except Exception as e:
+            print(f"⚠️  Encoder unavailable, skipping encode/chunk: {e}")
+            results.append({"bench": "encode", "skipped": str(e)})
+
+    if encoder is not None and "encode" in args.only:
+        print("🧮 Query encoding")
+        results += bench_encode(encoder, args.encode_batch_sizes, args.repeat)
+    if "search" in args.only:
+        print("🔎 Dense search")
+        results += bench_search(args.sizes, args.batch_sizes, args.k, args.repeat)
+    if "bm25" in args.only:
+        print("🔤 BM25 search")
+        results += bench_bm25([size for size in args.sizes if size <= args.bm25_max_size], args.k, args.repeat)
+    if encoder is not None and "chunk" in args.only:
+        print("✂️  Chunking")
+        results += bench_chunk(encoder.tokenizer, args.max_tokens, args.repeat)
+
+    print(f"📈 Peak RSS {peak_rss_mb():.0f} MB")
+    if args.json:
+        write_results(args.json, "micro", vars(args), results + [{"bench": "process", "peak_rss_mb": peak_rss_mb()}])
+
+
+if __name__ == "__main__":
+    main()
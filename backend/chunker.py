@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted, structure-aware chunking.
+
+The old chunker cut 500-word windows, several times MiniLM's 128-token input,
+so the encoder silently truncated most of every chunk. TokenChunker measures
+text with the encoder's own tokenizer and packs whole sentences into chunks
+that fit the model window:
+
+- a heading starts a new section, and its text prefixes every chunk of that
+  section so each vector keeps its context,
+- chunks break at paragraph and sentence boundaries, never mid-sentence
+  (unless a single sentence is longer than the budget),
+- consecutive chunks of a section share up to `overlap` tokens of trailing
+  sentences.
+
+All sentences of a page are tokenized in one batched call.
+"""
+
+import re
+from typing import List, Sequence, Tuple
+
+# [CLS] and [SEP] added by the encoder around every input
+SPECIAL_TOKENS = 2
+# Chunks shorter than this many characters carry too little to retrieve
+MIN_CHUNK_CHARS = 50
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[\"\'(\[]?[A-Z0-9])')
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+def token_lengths(tokenizer, texts: Sequence[str]) -> List[int]:
+    """Token counts (without special tokens) for many texts in one batched call.
+
+    Accepts a Hugging Face tokenizer (SentenceTransformer.tokenizer) or a
+    `tokenizers.Tokenizer` (as used by the ONNX encoder).
+    """
+    if not texts:
+        return []
+    if hasattr(tokenizer, 'encode_batch'):
+        return [len(encoding.ids) for encoding in tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+    encoded = tokenizer(list(texts), add_special_tokens=False, return_attention_mask=False,
+                        return_token_type_ids=False)
+    return [len(ids) for ids in encoded['input_ids']]
+
+
+class TokenChunker:
+    """Pack heading/paragraph/sentence units into chunks of at most `max_tokens` tokens."""
+
+    def __init__(self, tokenizer, max_tokens: int = 128, overlap: int = 32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        # Room for the text itself once the encoder adds its special tokens
+        self.budget = max_tokens - SPECIAL_TOKENS
+
+    @property
+    def signature(self) -> str:
+        """Identifies the chunking settings (changes force re-chunking on re-ingest)."""
+        return f"tokens:{self.max_tokens}:{self.overlap}"
+
+    def _sections(self, blocks: Sequence[Tuple[str, str]]) -> List[Tuple[str, List[List[str]]]]:
+        """Group blocks into (heading, [paragraph sentences]) sections."""
+        sections = [('', [])]
+        for kind, text in blocks:
+            if kind == 'heading':
+                if sections[-1][1] or not sections[-1][0]:
+                    sections.append((text, []))
+                else:
+                    # Consecutive headings (e.g. title + subtitle) form one heading
+                    sections[-1] = (sections[-1][0] + ' - ' + text, [])
+            else:
+                sections[-1][1].append(split_sentences(text))
+        return [(heading, paragraphs) for heading, paragraphs in sections if paragraphs]
+
+    def _split_long(self, sentence: str, length: int, budget: int) -> List[str]:
+        """Cut a sentence longer than the budget into word runs of roughly `budget` tokens."""
+        words = sentence.split()
+        per_piece = max(1, int(len(words) * budget / max(length, 1) * 0.9))
+        return [' '.join(words[i:i + per_piece]) for i in range(0, len(words), per_piece)]
+
+    def chunk_blocks(self, blocks: Sequence[Tuple[str, str]]) -> List[str]:
+        """Chunk a page given as ('heading' | 'text', text) blocks."""
+        return [chunk for _, chunk in self.chunk_sections(blocks)]
+
+    def chunk_sections(self, blocks: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Like chunk_blocks, but returns (heading, chunk) pairs; heading is the prefix
+        added to the chunk ('' if none), so callers can tell it apart from body text."""
+        sections = self._sections(blocks)
+        if not sections:
+            return []
+
+        # One batched tokenizer call for every heading and sentence of the page
+        units = [heading for heading, _ in sections]
+        units += [sentence for _, paragraphs in sections for sentences in paragraphs for sentence in sentences]
+        lengths = dict(zip(units, token_lengths(self.tokenizer, units)))
+
+        # Each section's budget leaves room for its "heading: " prefix
+        plans = []
+        for heading, paragraphs in sections:
+            budget = self.budget - (lengths[heading] + 1 if heading else 0)
+            if heading and budget < self.budget // 2:
+                # A heading that eats most of the window is kept as plain text instead
+                heading, budget = '', self.budget
+            plans.append((heading, budget, paragraphs))
+
+        # Sentences over their section's budget are split; pieces are measured in a second batch
+        pieces = {}
+        for _, budget, paragraphs in plans:
+            for sentences in paragraphs:
+                for sentence in sentences:
+                    if lengths[sentence] > budget:
+                        pieces[(sentence, budget)] = self._split_long(sentence, lengths[sentence], budget)
+        extra = [piece for split in pieces.values() for piece in split if piece not in lengths]
+        lengths.update(zip(extra, token_lengths(self.tokenizer, extra)))
+
+        chunks = []
+        for heading, budget, paragraphs in plans:
+            current, current_tokens = [], 0
+            for sentences in paragraphs:
+                for sentence in sentences:
+                    for unit in pieces.get((sentence, budget), [sentence]):
+                        unit_tokens = lengths[unit]
+                        if current and current_tokens + unit_tokens > budget:
+                            chunks.append((heading, self._join(heading, current)))
+                            current, current_tokens = self._overlap_tail(current, lengths)
+                            if current_tokens + unit_tokens > budget:
+                                current, current_tokens = [], 0
+                        current.append(unit)
+                        current_tokens += unit_tokens
+            if current:
+                chunks.append((heading, self._join(heading, current)))
+
+        seen = set()
+        unique = []
+        for heading, chunk in chunks:
+            if len(chunk) >= MIN_CHUNK_CHARS and chunk not in seen:
+                seen.add(chunk)
+                unique.append((heading, chunk))
+        return unique
+
+    def chunk_text(self, text: str) -> List[str]:
+        """Chunk plain text with no heading structure."""
+        return self.chunk_blocks([('text', text)])
+
+    def _overlap_tail(self, units: List[str], lengths) -> Tuple[List[str], int]:
+        """Trailing units of a finished chunk that fit in the overlap budget."""
+        tail, tokens = [], 0
+        for unit in reversed(units):
+            if tokens + lengths[unit] > self.overlap:
+                break
+            tail.insert(0, unit)
+            tokens += lengths[unit]
+        return tail, tokens
+
+    @staticmethod
+    def _join(heading: str, units: List[str]) -> str:
+        body = ' '.join(units)
+        return f"{heading}: {body}" if heading else body
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Bounded execution of CPU-bound work (query encoding, vector search).
+
+Requests are served by many cheap threads (gunicorn gthread) or greenlets
+(gevent) so slow LLM calls only cost an idle socket. CPU-heavy steps are
+funnelled through a small pool sized to the machine instead, so dozens of
+concurrent chats don't oversubscribe the CPU or, under gevent, block the hub.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def _running_under_gevent() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Per-process pool, created lazily so it is never inherited across fork."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='cpu')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def run_cpu_bound(fn, *args, **kwargs):
+    """Run fn on the bounded CPU pool and wait for its result.
+
+    Under gevent the call goes to the hub's native thread pool, so the
+    calling greenlet yields while other requests keep doing I/O.
+    """
+    if _running_under_gevent():
+        import gevent
+        threadpool = gevent.get_hub().threadpool
+        if threadpool.maxsize != CPU_WORKERS:
+            threadpool.maxsize = CPU_WORKERS
+        return threadpool.apply(fn, args, kwargs)
+    return _get_executor().submit(fn, *args, **kwargs).result()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted prompt assembly.
+
+Every answer used to send the top-k chunks verbatim, each with its own
+Source line, after an indented system prompt. ContextAssembler builds a
+smaller prompt carrying the same information:
+
+- chunks are grouped by page, in reading order, with the URL once per page,
+- text shared by consecutive chunks of a page (the chunker's overlap) and
+  repeated section headings (as recorded in the chunk metadata at ingest)
+  are sent once,
+- when the context is over budget, the sentences sharing the fewest query
+  terms are dropped. Each chunk's best sentence is reserved first, in
+  retrieval order, so every chunk keeps one while the budget allows and
+  better-retrieved chunks keep theirs when it does not; sentences of
+  better-retrieved chunks also win ties. Scoring needs no encoder pass, so
+  trimming adds no model latency to the request,
+- the system prompt is a fixed string, byte-identical across requests, whose
+  token count is computed once.
+
+Tokens are counted with tiktoken when it is installed, otherwise estimated at
+four characters per token.
+"""
+
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from chunker import split_sentences
+from sparse_index import tokenize
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _ENCODING = None
+
+SYSTEM_PROMPT = """You are Amal, a compassionate assistant for An-Nisa Hope Center.
+You answer questions based only on the provided context from the AnNisa.org website.
+
+Guidelines:
+- Only use information from the provided context
+- If you can't answer based on the context, say so politely
+- When relevant, include specific page links naturally within your response (e.g., "You can learn more at https://annisa.org/programs")
+- Be helpful, caring, and informative
+- Keep responses warm but concise
+- Don't mention "based on the context" - just answer conversationally
+- Speak in first person as Amal
+- Be very caring and compassionate, emphasize hope"""
+
+USER_PROMPT = """Context from AnNisa.org:
+{context}
+
+Question: {query}
+
+Please answer as Amal, including any relevant page URLs naturally in your response when they would be helpful to the person asking."""
+
+# Shown where sentences of a chunk were left out
+ELISION = '...'
+# Longest chunk overlap (in words) looked for between consecutive chunks
+MAX_OVERLAP_WORDS = 200
+WORD = re.compile(r'\w+')
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return max(1, (len(text) + 3) // 4)
+
+
+def overlap_length(previous: Sequence[str], words: Sequence[str]) -> int:
+    """Number of leading `words` that repeat the end of `previous`."""
+    for size in range(min(len(previous), len(words), MAX_OVERLAP_WORDS), 0, -1):
+        if previous[-size:] == words[:size]:
+            return size
+    return 0
+
+
+def heading_prefix(content: str, metadata: Dict) -> Tuple[str, str]:
+    """Split the chunker's "heading: " prefix off a chunk, or return ('', content).
+
+    Only the heading ingest recorded in the metadata is stripped, so body text
+    that merely looks like "Label: value" (e.g. "Phone: ...") is left alone.
+    """
+    heading = metadata.get('heading') or ''
+    if heading and content.startswith(heading + ': '):
+        return heading, content[len(heading) + 2:]
+    return '', content
+
+
+class ContextAssembler:
+    """Build compact chat messages for a query and its retrieved chunks within a token budget."""
+
+    def __init__(self, budget: int = 900):
+        # Whole-prompt budget: system prompt, template, query and context together
+        self.budget = budget
+        self.system_message = {"role": "system", "content": SYSTEM_PROMPT}
+        # Fixed for the life of the process; only the context and query vary
+        self.fixed_tokens = count_tokens(SYSTEM_PROMPT) + count_tokens(USER_PROMPT.format(context='', query=''))
+
+    def build_messages(self, query: str, context_chunks: List[Dict]) -> List[Dict]:
+        context_budget = self.budget - self.fixed_tokens - count_tokens(query)
+        context = self.assemble(query, context_chunks, context_budget)
+        return [self.system_message,
+                {"role": "user", "content": USER_PROMPT.format(context=context, query=query)}]
+
+    def assemble(self, query: str, context_chunks: List[Dict], budget: int) -> str:
+        pages = self.page_sentences(context_chunks)
+        units = [unit for _, chunks in pages for sentences in chunks for unit in sentences]
+        lengths = [count_tokens(text) for text, _ in units]
+        # URL lines and separators
+        overhead = sum(count_tokens(url) + 2 for url, _ in pages)
+
+        keep = set(range(len(units)))
+        if sum(lengths) + overhead > budget:
+            keep = self.select(query, units, lengths, budget - overhead)
+
+        blocks, position = [], 0
+        for url, chunks in pages:
+            parts = []
+            for sentences in chunks:
+                kept = []
+                for text, _ in sentences:
+                    if position in keep:
+                        kept.append(text)
+                    elif not kept or kept[-1] != ELISION:
+                        kept.append(ELISION)
+                    position += 1
+                if any(text != ELISION for text in kept):
+                    parts.append(' '.join(kept))
+            if parts:
+                blocks.append(f"[{url}]\n" + '\n'.join(parts))
+        return '\n\n'.join(blocks)
+
+    def page_sentences(self, context_chunks: List[Dict]) -> List[Tuple[str, List[List[Tuple[str, int]]]]]:
+        """Group chunks by page (best-ranked page first) in reading order, without repeated text.
+
+        Returns [(url, [[(sentence, chunk rank), ...] per chunk])].
+        """
+        pages: Dict[str, List[Tuple[int, int, str, str]]] = {}
+        for rank, chunk in enumerate(context_chunks):
+            metadata = chunk['metadata']
+            heading, body = heading_prefix(chunk['content'], metadata)
+            pages.setdefault(metadata['url'], []).append((metadata.get('chunk_id', rank), rank, heading, body))
+
+        result = []
+        seen_sentences = set()
+        for url, chunks in pages.items():
+            chunks.sort()
+            page, headings, previous_id, previous_words = [], set(), None, []
+            for chunk_id, rank, heading, body in chunks:
+                words = body.split()
+                if previous_id is not None and chunk_id == previous_id + 1:
+                    # Drop the overlap the chunker repeated from the previous chunk
+                    words = words[overlap_length(previous_words, words):]
+                previous_id, previous_words = chunk_id, body.split()
+                if heading in headings:
+                    heading = ''
+                elif heading:
+                    headings.add(heading)
+
+                sentences = []
+                for sentence in split_sentences(' '.join(words)):
+                    key = ' '.join(WORD.findall(sentence.lower()))
+                    if key and key not in seen_sentences:
+                        seen_sentences.add(key)
+                        sentences.append(sentence)
+                if sentences:
+                    if heading:
+                        sentences[0] = f"{heading}: {sentences[0]}"
+                    page.append([(sentence, rank) for sentence in sentences])
+            if page:
+                result.append((url, page))
+        return result
+
+    def select(self, query: str, units: List[Tuple[str, int]], lengths: List[int], budget: int) -> set:
+        """Indices of the sentences to keep: each chunk's best sentence first, then the best of the rest.
+
+        Best sentences are reserved in retrieval order, so when they do not all
+        fit it is the lower-ranked chunks that lose theirs; the top chunk's best
+        sentence is kept even if it alone is over budget.
+        """
+        scores = self.score(query, [text for text, _ in units])
+        # Earlier (better-ranked) chunks win ties
+        order = sorted(range(len(units)), key=lambda i: (-scores[i], units[i][1], i))
+
+        best_of_chunk: Dict[int, int] = {}
+        for i in order:
+            best_of_chunk.setdefault(units[i][1], i)
+        keep, used = set(), 0
+        for rank in sorted(best_of_chunk):
+            i = best_of_chunk[rank]
+            if used + lengths[i] <= budget or not keep:
+                keep.add(i)
+                used += lengths[i]
+        for i in order:
+            if i not in keep and used + lengths[i] <= budget:
+                keep.add(i)
+                used += lengths[i]
+        return keep
+
+    @staticmethod
+    def score(query: str, sentences: List[str]) -> np.ndarray:
+        """Relevance of each sentence to the query: the share of query terms it contains."""
+        terms = set(tokenize(query))
+        return np.asarray([len(terms & set(tokenize(sentence))) / (len(terms) or 1)
+                           for sentence in sentences], dtype=np.float32)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Persisted crawl state for incremental re-ingestion.
+
+For every URL the manifest remembers the validators the server sent (ETag,
+Last-Modified), a hash of the extracted text and the hashes of the chunks it
+produced. Re-runs send conditional GETs, skip pages whose text is unchanged and
+only re-embed chunks whose text hash is not already in the current store.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+CRAWL_MANIFEST_PATH = os.environ.get('CRAWL_MANIFEST_PATH', 'data/crawl_manifest.json')
+MANIFEST_VERSION = 1
+
+
+def text_hash(text: str) -> str:
+    """Stable content hash used for pages and chunks."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+class CrawlManifest:
+    """Per-URL validators and content hashes from the previous ingest run."""
+
+    def __init__(self, path: str = CRAWL_MANIFEST_PATH, pages: Optional[Dict] = None,
+                 model: str = '', chunker: str = ''):
+        self.path = path
+        self.pages = pages or {}
+        self.model = model
+        self.chunker = chunker
+
+    @classmethod
+    def load(cls, path: str = CRAWL_MANIFEST_PATH) -> 'CrawlManifest':
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # A corrupt manifest only costs a full re-crawl
+            return cls(path)
+        if data.get('version') != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get('pages', {}), data.get('model', ''), data.get('chunker', ''))
+
+    def save(self):
+        """Write atomically so an interrupted run never leaves a truncated manifest."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'model': self.model,
+                'chunker': self.chunker,
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'pages': self.pages,
+            }, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for a previously seen URL."""
+        page = self.pages.get(url)
+        headers = {}
+        if page:
+            if page.get('etag'):
+                headers['If-None-Match'] = page['etag']
+            if page.get('last_modified'):
+                headers['If-Modified-Since'] = page['last_modified']
+        return headers
+
+    def page_hash(self, url: str) -> Optional[str]:
+        return self.pages.get(url, {}).get('content_hash')
+
+    def links(self, url: str) -> List[str]:
+        """Outgoing links recorded for a page (used when it answers 304)."""
+        return self.pages.get(url, {}).get('links', [])
+
+    def update(self, url: str, response_headers: Dict, content_hash: str, chunk_hashes: List[str],
+               links: Optional[List[str]] = None):
+        headers = {key.lower(): value for key, value in (response_headers or {}).items()}
+        self.pages[url] = {
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'content_hash': content_hash,
+            'chunks': chunk_hashes,
+            'links': links or [],
+            'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+    def forget(self, url: str):
+        """Drop a page that no longer exists."""
+        self.pages.pop(url, None)
+
+    def touch(self, url: str):
+        """Record that an unchanged page was re-validated."""
+        if url in self.pages:
+            self.pages[url]['fetched_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
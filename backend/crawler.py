@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Concurrent, polite HTTP fetcher for content ingestion.
+
+Replaces one-at-a-time requests.get calls separated by a global sleep with:
+- a thread pool issuing requests concurrently,
+- one keep-alive requests.Session whose connection pool is sized to the pool,
+- per-host rate limiting (a minimum interval between request starts per host),
+- retries with exponential backoff and jitter on connection errors, 429 and 5xx
+  (honouring Retry-After).
+
+`Crawler.crawl` additionally discovers pages: it seeds a bounded, deduplicated
+priority frontier from the given pages and the site's sitemaps, then follows
+same-site links while fetches are in flight, up to a depth and page limit.
+
+Point it at a local stub server (any base URL) to test ingestion offline.
+"""
+
+import heapq
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urldefrag, urlencode, urljoin, urlparse, urlunparse
+
+import requests
+from lxml import etree, html as lxml_html
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Query parameters that never change page content
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|_ga|ref)$', re.IGNORECASE)
+# Links to these are not pages worth extracting
+SKIP_EXTENSIONS = re.compile(
+    r'\.(pdf|jpe?g|png|gif|svg|webp|ico|css|js|json|xml|zip|mp3|mp4|mov|docx?|xlsx?|pptx?)$', re.IGNORECASE
+)
+# WordPress paths that only duplicate real pages
+SKIP_PATHS = re.compile(r'/(wp-admin|wp-json|wp-content|wp-includes|feed|comments|xmlrpc\.php)(/|$)')
+SITEMAP_PATHS = ('/sitemap.xml', '/sitemap_index.xml', '/wp-sitemap.xml')
+
+
+def is_transient(result: Dict) -> bool:
+    """True when a failed fetch may succeed later (network error, 429, 5xx), unlike a page that is gone (404, 410)."""
+    status = result['status']
+    return status is None or status == 429 or status >= 500
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so trivially different spellings dedupe to one frontier entry.
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, sorts the query string and gives bare hosts a "/" path.
+    """
+    url, _ = urldefrag(url.strip())
+    parts = urlparse(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAMS.match(k)))
+    return urlunparse((scheme, host, path, '', query, ''))
+
+
+def site_hosts(base_url: str) -> set:
+    """Hosts treated as the same site as base_url (with and without www.)."""
+    host = urlparse(canonicalize_url(base_url)).netloc
+    bare = host[4:] if host.startswith('www.') else host
+    return {bare, 'www.' + bare}
+
+
+def is_crawlable(url: str, hosts: set) -> bool:
+    parts = urlparse(url)
+    return (parts.scheme in ('http', 'https') and parts.netloc in hosts
+            and not SKIP_EXTENSIONS.search(parts.path) and not SKIP_PATHS.search(parts.path))
+
+
+def extract_links(page_url: str, content: bytes) -> List[str]:
+    """Absolute, canonical href targets of an HTML page."""
+    try:
+        doc = lxml_html.fromstring(content)
+    except (etree.ParserError, ValueError):
+        return []
+    links = []
+    for href in doc.xpath('//a/@href'):
+        href = href.strip()
+        if href and not href.startswith(('mailto:', 'tel:', 'javascript:', '#')):
+            links.append(canonicalize_url(urljoin(page_url, href)))
+    return links
+
+
+def parse_sitemap(content: bytes) -> Tuple[List[Tuple[str, float]], List[str]]:
+    """Return ([(page_url, priority)], [nested_sitemap_url]) from sitemap XML."""
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return [], []
+    pages, sitemaps = [], []
+    for element in root:
+        tag = element.tag.rsplit('}', 1)[-1]
+        fields = {child.tag.rsplit('}', 1)[-1]: (child.text or '').strip() for child in element}
+        if not fields.get('loc'):
+            continue
+        if tag == 'sitemap':
+            sitemaps.append(fields['loc'])
+        elif tag == 'url':
+            try:
+                priority = float(fields.get('priority') or 0.5)
+            except ValueError:
+                priority = 0.5
+            pages.append((fields['loc'], priority))
+    return pages, sitemaps
+
+
+def content_type(headers: Dict) -> str:
+    for key, value in headers.items():
+        if key.lower() == 'content-type':
+            return value
+    return ''
+
+
+class HostRateLimiter:
+    """Space out request starts to each host by at least `interval` seconds."""
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def penalize(self, host: str, delay: float):
+        """Push back every future request to a host (e.g. after a 429)."""
+        with self._lock:
+            self._next_slot[host] = max(self._next_slot.get(host, 0), time.monotonic() + delay)
+
+
+class Frontier:
+    """Deduplicated priority queue of URLs to fetch, bounded in size.
+
+    Lower depth is fetched first; within a depth, higher sitemap priority and
+    then discovery order win. URLs are canonicalized before deduplication.
+    """
+
+    def __init__(self, max_size: int = 1000, max_depth: int = 3):
+        self.max_size = max_size
+        self.max_depth = max_depth
+        self.seen = set()
+        self._heap = []
+        self._order = 0
+
+    def push(self, url: str, depth: int, priority: float = 0.5) -> bool:
+        url = canonicalize_url(url)
+        if url in self.seen or depth > self.max_depth or len(self._heap) >= self.max_size:
+            return False
+        self.seen.add(url)
+        heapq.heappush(self._heap, (depth, -priority, self._order, url))
+        self._order += 1
+        return True
+
+    def pop(self) -> Tuple[str, int]:
+        depth, _, _, url = heapq.heappop(self._heap)
+        return url, depth
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class Crawler:
+    """Fetch many URLs concurrently over pooled keep-alive connections."""
+
+    def __init__(self, max_workers: int = 8, host_interval: float = 0.25, max_retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 10, headers: Optional[Dict] = None):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(host_interval)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        # Retries are handled here (with backoff and rate limiting), not by urllib3
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url: str, headers: Optional[Dict] = None) -> Dict:
+        """Fetch one URL with retries. Never raises; errors are reported in the result."""
+        host = urlparse(url).netloc
+        error = None
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(host)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = str(e)
+                response = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return {
+                        'url': url,
+                        'final_url': response.url,
+                        'status': response.status_code,
+                        'headers': dict(response.headers),
+                        'content': response.content,
+                        'elapsed': time.perf_counter() - start,
+                        'attempts': attempt + 1,
+                        'error': None if response.ok or response.status_code == 304 else f"HTTP {response.status_code}",
+                    }
+                error = f"HTTP {response.status_code}"
+
+            if attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                if response is not None and response.status_code == 429:
+                    self.rate_limiter.penalize(host, delay)
+                time.sleep(delay)
+
+        return {
+            'url': url, 'final_url': url, 'status': None, 'headers': {}, 'content': b'',
+            'elapsed': 0.0, 'attempts': self.max_retries + 1, 'error': error,
+        }
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Exponential backoff with full jitter
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def fetch_all(self, urls: Iterable[str], headers_for=None) -> Iterator[Dict]:
+        """Fetch URLs concurrently, yielding results as they complete.
+
+        `headers_for(url)` may supply per-request headers (e.g. conditional GETs).
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='crawl') as pool:
+            futures = [
+                pool.submit(self.fetch, url, headers_for(url) if headers_for else None)
+                for url in urls
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def sitemap_pages(self, base_url: str, max_sitemaps: int = 20) -> List[Tuple[str, float]]:
+        """Page URLs listed by the site's sitemaps (robots.txt Sitemap: lines or common paths)."""
+        robots = self.fetch(urljoin(base_url, '/robots.txt'))
+        pending = []
+        if not robots['error']:
+            pending = re.findall(r'(?im)^\s*sitemap:\s*(\S+)', robots['content'].decode('utf-8', 'replace'))
+        if not pending:
+            pending = [urljoin(base_url, path) for path in SITEMAP_PATHS]
+
+        pages, fetched = [], set()
+        while pending and len(fetched) < max_sitemaps:
+            batch = [url for url in dict.fromkeys(pending) if url not in fetched][:max_sitemaps - len(fetched)]
+            pending = []
+            fetched.update(batch)
+            for result in self.fetch_all(batch):
+                if result['error']:
+                    continue
+                found, nested = parse_sitemap(result['content'])
+                pages.extend(found)
+                pending.extend(nested)
+        return pages
+
+    def crawl(self, seeds: Iterable[str], max_pages: int = 200, max_depth: int = 3,
+              use_sitemap: bool = True, frontier_size: int = 1000,
+              headers_for: Optional[Callable[[str], Dict]] = None,
+              links_for: Optional[Callable[[str], List[str]]] = None) -> Iterator[Dict]:
+        """Fetch seeds plus discovered same-site pages, yielding results as they complete.
+
+        Links found in each fetched page are pushed to the frontier while other
+        fetches are still in flight, so discovery adds no serial round trips.
+        `links_for(url)` supplies the known links of pages answered with 304.
+        Each result carries the `depth` it was found at and its outgoing `links`.
+        """
+        seeds = [canonicalize_url(url) for url in seeds]
+        if not seeds:
+            return
+        hosts = site_hosts(seeds[0])
+        frontier = Frontier(frontier_size, max_depth)
+        for url in seeds:
+            frontier.push(url, 0, 1.0)
+        if use_sitemap:
+            for url, priority in self.sitemap_pages(seeds[0]):
+                url = canonicalize_url(url)
+                if is_crawlable(url, hosts):
+                    frontier.push(url, 1, priority)
+
+        yielded = set()
+        submitted = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='crawl') as pool:
+            in_flight = {}
+            while in_flight or (frontier and submitted < max_pages):
+                while frontier and submitted < max_pages and len(in_flight) < self.max_workers:
+                    url, depth = frontier.pop()
+                    headers = headers_for(url) if headers_for else None
+                    in_flight[pool.submit(self.fetch, url, headers)] = depth
+                    submitted += 1
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    depth = in_flight.pop(future)
+                    result = future.result()
+                    result['depth'] = depth
+
+                    # Redirects can land several frontier URLs on the same page
+                    final_url = canonicalize_url(result['final_url'] or result['url'])
+                    if final_url in yielded:
+                        continue
+                    yielded.add(final_url)
+                    frontier.seen.add(final_url)
+
+                    if result['status'] == 304 and links_for:
+                        links = links_for(result['url']) or []
+                    elif not result['error'] and 'html' in (content_type(result['headers']) or 'text/html'):
+                        links = extract_links(final_url, result['content'])
+                    else:
+                        links = []
+                    result['links'] = [url for url in dict.fromkeys(links) if is_crawlable(url, hosts)]
+                    for url in result['links']:
+                        frontier.push(url, depth + 1)
+                    yield result
+
+    def close(self):
+        self.session.close()
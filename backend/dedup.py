@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for chunks with MinHash and LSH banding.
+
+Site pages repeat the same donate banners and contact sections, so ingestion
+used to store (and search) many near-identical chunks. Each chunk is reduced
+to a MinHash signature over its word shingles; LSH bands find candidate
+matches among the chunks kept so far, and a candidate whose estimated Jaccard
+similarity reaches the threshold makes the new chunk a duplicate.
+"""
+
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Mersenne prime larger than any 32-bit shingle hash; a*x + b stays below 2**64
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+WORD = re.compile(r'\w+')
+
+
+class MinHashDeduper:
+    """Incrementally keep chunks that are not near-duplicates of earlier ones."""
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+        self._ids: List[int] = []
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm uint32 values) of the text's word shingles."""
+        words = WORD.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {' '.join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # (num_perm, n_shingles) universal hashes, min over shingles
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _PRIME & _MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def add(self, text: str, item_id: int) -> Optional[int]:
+        """Return the id of an earlier near-duplicate of `text`, or register it as new and return None."""
+        signature = self.signature(text)
+        band_keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+        candidates = set()
+        for band, key in zip(self._buckets, band_keys):
+            candidates.update(band.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for index in candidates:
+            similarity = float(np.mean(self._signatures[index] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = index, similarity
+        if best is not None:
+            return self._ids[best]
+
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        self._ids.append(item_id)
+        for band, key in zip(self._buckets, band_keys):
+            band.setdefault(key, []).append(index)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
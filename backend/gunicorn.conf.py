@@ -3,12 +3,17 @@ import os
 # Server configuration
 bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
 workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
-worker_class = "sync"
+# "gthread" (default) serves each request on a thread, so a slow OpenAI call only
+# parks one thread instead of the whole worker. "gevent" (pip install gevent)
+# uses greenlets for even cheaper concurrency; "sync" restores the old behaviour.
+# Query encoding and vector search are bounded separately by CPU_WORKERS.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 100
 preload_app = True
-keepalive = 2
+keepalive = 5
 timeout = 120
 
 # Logging
@@ -20,4 +25,4 @@ errorlog = "-"
 proc_name = 'annisa-chatbot'
 
 # Worker processes - Use /tmp for Render
-worker_tmp_dir = '/tmp' 
\ No newline at end of file
+worker_tmp_dir = '/tmp'
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Shared HTML → text extraction for ingestion and the page text extractor.
+
+Both tools used to parse with BeautifulSoup's pure-Python html.parser, call
+decompose() per boilerplate tag and run several select_one passes. This
+module parses once with lxml (libxml2), strips boilerplate in a single pass
+and finds the main content area with XPath expressions compiled at import.
+
+    python -m bench.html_extract   # parse-time comparison on saved pages
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree, html as lxml_html
+
+# Elements never holding page content
+BOILERPLATE_TAGS = ('script', 'style', 'noscript', 'template', 'svg', 'iframe', 'nav', 'footer', 'header')
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Site chrome marked up by role or by common WordPress/theme class names
+BOILERPLATE_XPATH = etree.XPath(
+    '//*[@role="navigation" or @role="banner" or @role="contentinfo" or @role="dialog" or '
+    + ' or '.join(_has_class(name) for name in (
+        'sidebar', 'widget-area', 'breadcrumbs', 'screen-reader-text', 'skip-link',
+        'cookie-notice', 'sharedaddy', 'comments-area',
+    ))
+    + ']'
+)
+
+# Main content candidates, most specific first; the first match wins
+MAIN_CONTENT_XPATHS = [etree.XPath(expr) for expr in (
+    '//main',
+    '//*[@role="main"]',
+    '//article',
+    f'//*[{_has_class("main-content")}]',
+    f'//*[{_has_class("page-content")}]',
+    f'//*[{_has_class("post-content")}]',
+    f'//*[{_has_class("entry-content")}]',
+    '//*[@id="content"]',
+    '//*[@id="main"]',
+    f'//*[{_has_class("content")}]',
+    '//section',
+)]
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+# Tags that start a new block of text (a paragraph boundary for the chunker)
+BLOCK_TAGS = HEADING_TAGS | {
+    'p', 'div', 'section', 'article', 'main', 'aside', 'li', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'table', 'tr', 'td', 'th', 'blockquote', 'pre', 'figure', 'figcaption', 'br', 'hr',
+    'form', 'fieldset', 'address',
+}
+
+TITLE_XPATH = etree.XPath('string(//title)')
+BODY_XPATH = etree.XPath('//body')
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def text_blocks(element) -> List[Tuple[str, str]]:
+    """Split an element's text into ('heading' | 'text', text) blocks in document order.
+
+    Inline markup (links, emphasis, spans) stays inside its block; every
+    block-level tag starts a new one, so nested blocks are never duplicated.
+    """
+    blocks = []
+    buffer = []
+
+    def flush(kind: str = 'text'):
+        text = WHITESPACE.sub(' ', ''.join(buffer)).strip()
+        buffer.clear()
+        if text:
+            blocks.append((kind, text))
+
+    def walk(node):
+        tag = node.tag if isinstance(node.tag, str) else None
+        if tag is None:
+            # Comments and processing instructions
+            return
+        block = tag in BLOCK_TAGS
+        if block:
+            flush()
+        if node.text:
+            buffer.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                buffer.append(child.tail)
+        if block:
+            flush('heading' if tag in HEADING_TAGS else 'text')
+
+    walk(element)
+    flush()
+    return blocks
+
+
+def parse_html(content) -> Optional[etree._Element]:
+    """Parse an HTML document (bytes or str), returning None if it is empty or unparseable."""
+    if not content:
+        return None
+    try:
+        return lxml_html.fromstring(content)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def remove_boilerplate(doc: etree._Element):
+    """Drop scripts, styles and site chrome in place (their tail text is kept)."""
+    etree.strip_elements(doc, *BOILERPLATE_TAGS, with_tail=False)
+    for element in BOILERPLATE_XPATH(doc):
+        if element.getparent() is not None:
+            element.drop_tree()
+
+
+def main_content(doc: etree._Element):
+    """The page's main content element, falling back to <body> or the whole document."""
+    for xpath in MAIN_CONTENT_XPATHS:
+        found = xpath(doc)
+        if found:
+            return found[0]
+    body = BODY_XPATH(doc)
+    return body[0] if body else doc
+
+
+def extract_page(content, url: str = '') -> Optional[Dict[str, str]]:
+    """Extract title and main-content text from an HTML page.
+
+    Returns {'url', 'title', 'text', 'blocks'} with whitespace collapsed, or
+    None if the document cannot be parsed. `blocks` keeps the heading and
+    paragraph structure (see text_blocks) for structure-aware chunking.
+    """
+    doc = parse_html(content)
+    if doc is None:
+        return None
+    title = WHITESPACE.sub(' ', TITLE_XPATH(doc)).strip()
+    remove_boilerplate(doc)
+    blocks = text_blocks(main_content(doc))
+    return {'url': url, 'title': title, 'text': ' '.join(text for _, text in blocks), 'blocks': blocks}
+
@@ -4,29 +4,90 @@ Web scraping and content ingestion script for AnNisa.org chatbot.
 Crawls key pages, chunks content, creates embeddings, and stores them.
 """
 
+import copy
 import os
-import requests
-from bs4 import BeautifulSoup
-import pickle
 import re
 from urllib.parse import urljoin, urlparse
-import time
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from chunker import TokenChunker
+from crawl_manifest import CrawlManifest, text_hash
+from crawler import Crawler, canonicalize_url, content_type, is_transient
+from dedup import MinHashDeduper
+from html_extract import extract_page
+from kb_store import (KB_ROOT, KnowledgeBaseStore, KnowledgeBaseWriter, build_store_bm25, build_store_index,
+                      current_version)
+from pipeline import batched, threaded
+from vector_index import index_params_from_env
+
+# Vector index built alongside the store: "flat" (exact), "ivf" or "hnsw"
+INDEX_KIND = os.environ.get('KB_INDEX', 'flat')
+
+# Streaming pipeline: fetched pages buffered between stages, chunks per embed batch
+PIPELINE_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', '16'))
+EMBED_BATCH_SIZE = int(os.environ.get('INGEST_EMBED_BATCH', '64'))
+
+# Chunk size in encoder tokens (default: the model's max_seq_length) and overlap
+CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', '0'))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', '32'))
+
+# Estimated Jaccard similarity at which a chunk counts as a near-duplicate (0 disables)
+DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', '0.8'))
 
 class AnNisaContentIngester:
-    def __init__(self):
-        self.base_url = "https://annisa.org"
+    def __init__(self, base_url: str = "https://annisa.org", incremental: bool = True):
+        self.base_url = base_url
         # Use the same smaller, optimized model as in app.py
         # paraphrase-MiniLM-L3-v2: ~14MB, optimized for CPU, ~95% performance
-        self.model = SentenceTransformer('paraphrase-MiniLM-L3-v2', device='cpu')
-        self.chunks = []
-        self.embeddings = []
-        self.metadata = []
+        self.model_name = 'paraphrase-MiniLM-L3-v2'
+        self.model = SentenceTransformer(self.model_name, device='cpu')
+        # Chunks sized to the encoder window, measured with a copy of its tokenizer: the
+        # chunking thread runs alongside encoding, and a fast tokenizer's truncation and
+        # padding state cannot be shared between threads ("Already borrowed")
+        self.chunker = TokenChunker(
+            copy.deepcopy(self.model.tokenizer),
+            max_tokens=CHUNK_MAX_TOKENS or self.model.max_seq_length,
+            overlap=CHUNK_OVERLAP_TOKENS,
+        )
+        # Drops repeated banners/sections; duplicates add their URL to the kept chunk
+        self.deduper = MinHashDeduper(DEDUP_THRESHOLD) if DEDUP_THRESHOLD > 0 else None
+        self.duplicate_urls = {}
+        self.duplicates = 0
+        
+        # Running totals; chunks themselves stream straight to the store
+        self.chunk_hashes = []
+        self.chunk_urls = []
+        self.pages_processed = 0
+        self.pages_unchanged = 0
+        self.embedded = 0
+        self.reused = 0
+        
+        # Concurrent fetcher with pooled connections, per-host politeness and retries
+        self.crawler = Crawler(
+            max_workers=int(os.environ.get('CRAWL_WORKERS', '8')),
+            host_interval=float(os.environ.get('CRAWL_HOST_INTERVAL', '0.25')),
+            max_retries=int(os.environ.get('CRAWL_MAX_RETRIES', '3')),
+        )
+        # Discovery: sitemap entries and same-site links beyond target_pages
+        self.max_pages = int(os.environ.get('CRAWL_MAX_PAGES', '200'))
+        self.max_depth = int(os.environ.get('CRAWL_MAX_DEPTH', '3'))
+        self.use_sitemap = os.environ.get('CRAWL_SITEMAP', 'true').lower() == 'true'
+        
+        # Previous run's crawl state and store, used to skip unchanged pages and chunks
+        self.manifest = CrawlManifest.load()
+        self.previous = None
+        if incremental and current_version(KB_ROOT) and self.manifest.model == self.model_name:
+            try:
+                self.previous = KnowledgeBaseStore.open(KB_ROOT)
+            except Exception as e:
+                print(f"⚠️ Could not open previous knowledge base, doing a full ingest: {e}")
+        self.reuse_pages = self.previous is not None and self.manifest.chunker == self.chunker.signature
+        self.manifest.model = self.model_name
+        self.manifest.chunker = self.chunker.signature
         
-        # Key pages to crawl
+        # Key pages to crawl first; more are discovered from the sitemap and links
         self.target_pages = [
             "/",
             "/about",
@@ -56,125 +117,190 @@ class AnNisaContentIngester:
     
     def extract_content(self, url: str) -> Dict[str, str]:
         """Extract content from a single page."""
-        try:
-            print(f"Scraping: {url}")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.decompose()
-            
-            # Extract title
-            title = soup.find('title')
-            title_text = title.get_text() if title else ""
-            
-            # Extract main content
-            content_selectors = [
-                'main', 'article', '.content', '#content', 
-                '.main-content', '.page-content', 'section'
-            ]
-            
-            content_text = ""
-            for selector in content_selectors:
-                content_elem = soup.select_one(selector)
-                if content_elem:
-                    content_text = content_elem.get_text()
-                    break
-            
-            # Fallback to body if no specific content area found
-            if not content_text:
-                content_text = soup.body.get_text() if soup.body else soup.get_text()
-            
-            # Clean the content
-            clean_content = self.clean_text(content_text)
-            
-            return {
-                'url': url,
-                'title': self.clean_text(title_text),
-                'content': clean_content
-            }
-            
-        except Exception as e:
-            print(f"Error scraping {url}: {str(e)}")
+        print(f"Scraping: {url}")
+        result = self.crawler.fetch(url)
+        if result['error']:
+            print(f"Error scraping {url}: {result['error']}")
             return None
+        return self.parse_content(url, result['content'])
     
-    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-        """Split text into overlapping chunks."""
-        words = text.split()
-        chunks = []
-        
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
-            if len(chunk.strip()) > 50:  # Only keep substantial chunks
-                chunks.append(chunk)
+    def parse_content(self, url: str, html: bytes) -> Dict:
+        """Extract title, main text and its heading/paragraph blocks from fetched HTML."""
+        page = extract_page(html, url)
+        if page is None:
+            print(f"Error parsing {url}: unreadable HTML")
+            return None
         
-        return chunks
+        blocks = [(kind, self.clean_text(text)) for kind, text in page['blocks']]
+        blocks = [(kind, text) for kind, text in blocks if text]
+        return {
+            'url': url,
+            'title': self.clean_text(page['title']),
+            'content': ' '.join(text for _, text in blocks),
+            'blocks': blocks
+        }
+    
+    def chunk_text(self, content_data: Dict) -> List[Tuple[str, str]]:
+        """Split a page into token-budgeted (heading, chunk) pairs along headings, paragraphs and sentences."""
+        return self.chunker.chunk_sections(content_data['blocks'])
+    
+    def previous_page_rows(self) -> Dict[str, List[int]]:
+        """Rows of the previous store grouped by source URL (including merged duplicate sources)."""
+        rows = {}
+        if self.previous is not None:
+            for i, meta in enumerate(self.previous.metadata):
+                for url in dict.fromkeys([meta.get('url')] + meta.get('urls', [])):
+                    rows.setdefault(url, []).append(i)
+        return rows
+    
+    def previous_embeddings(self) -> Dict[str, int]:
+        """Map chunk hash -> row of the previous store, for embedding reuse."""
+        if self.previous is None:
+            return {}
+        rows = {}
+        for i, (chunk, meta) in enumerate(zip(self.previous.chunks, self.previous.metadata)):
+            rows.setdefault(meta.get('chunk_hash') or text_hash(chunk), i)
+        return rows
     
-    def scrape_all_pages(self):
-        """Scrape all target pages and create chunks."""
-        print("Starting content ingestion for AnNisa.org...")
+    def crawl_pages(self) -> Iterator[Dict]:
+        """Stage 1: fetch the target pages plus discovered pages concurrently."""
+        seeds = [canonicalize_url(urljoin(self.base_url, page_path)) for page_path in self.target_pages]
+        headers_for = self.manifest.conditional_headers if self.reuse_pages else None
+        return self.crawler.crawl(
+            seeds, max_pages=self.max_pages, max_depth=self.max_depth, use_sitemap=self.use_sitemap,
+            headers_for=headers_for, links_for=self.manifest.links,
+        )
+    
+    def chunk_pages(self, results: Iterable[Dict]) -> Iterator[Tuple[str, Dict, Optional[int]]]:
+        """Stage 2: parse and chunk fetched pages as they arrive.
+        
+        Yields (chunk, metadata, previous_row); previous_row points at a stored
+        embedding that can be reused, or is None if the chunk must be embedded.
+        With a previous knowledge base, unchanged pages (304 or identical text)
+        and pages that failed transiently keep their old chunks; pages that are
+        gone (404, 410) are dropped.
+        """
+        previous_rows = self.previous_page_rows()
+        previous_vectors = self.previous_embeddings()
         
-        for page_path in self.target_pages:
-            url = urljoin(self.base_url, page_path)
-            content_data = self.extract_content(url)
+        for result in results:
+            url = result['url']
+            reuse = False
+            if self.reuse_pages and url in previous_rows and (
+                    result['status'] == 304 or (result['error'] and is_transient(result))):
+                # Unchanged (or temporarily unreachable): keep what we already have
+                reason = "not modified" if result['status'] == 304 else f"kept after error: {result['error']}"
+                print(f"Unchanged: {url} ({reason})")
+                self.manifest.touch(url)
+                reuse = True
+            elif result['error']:
+                print(f"Error scraping {url}: {result['error']}")
+                if not is_transient(result):
+                    # Gone (404, 410, ...): its old chunks are not carried into the new version
+                    self.manifest.forget(url)
+                continue
+            elif 'html' not in (content_type(result['headers']) or 'text/html'):
+                continue
+            else:
+                content_data = self.parse_content(url, result['content'])
+                if not content_data or not content_data['content']:
+                    continue
+                content_hash = text_hash(content_data['content'])
+                if self.reuse_pages and url in previous_rows and content_hash == self.manifest.page_hash(url):
+                    print(f"Unchanged: {url} (same content)")
+                    self.manifest.update(url, result['headers'], content_hash,
+                                         self.manifest.pages[url].get('chunks', []), result['links'])
+                    reuse = True
             
-            if content_data and content_data['content']:
-                # Create chunks from the content
-                text_chunks = self.chunk_text(content_data['content'])
-                
-                for i, chunk in enumerate(text_chunks):
-                    self.chunks.append(chunk)
-                    self.metadata.append({
-                        'url': content_data['url'],
-                        'title': content_data['title'],
-                        'chunk_id': i,
-                        'source': 'annisa.org'
-                    })
-                
-                print(f"  → Added {len(text_chunks)} chunks from {url}")
+            self.pages_processed += 1
+            if reuse:
+                self.pages_unchanged += 1
+                for row in previous_rows[url]:
+                    # Sources are merged afresh each run, so drop the stored list
+                    meta = {key: value for key, value in self.previous.metadata[row].items() if key != 'urls'}
+                    yield self.previous.chunks[row], dict(meta, url=url), row
+                continue
             
-            # Be respectful with requests
-            time.sleep(1)
-        
-        print(f"\nTotal chunks collected: {len(self.chunks)}")
-    
-    def create_embeddings(self):
-        """Create embeddings for all chunks."""
-        print("Creating embeddings...")
-        
-        if not self.chunks:
-            print("No chunks to embed!")
-            return
+            # Create chunks from the content
+            text_chunks = self.chunk_text(content_data)
+            hashes = [text_hash(chunk) for _, chunk in text_chunks]
+            for i, ((heading, chunk), chunk_hash) in enumerate(zip(text_chunks, hashes)):
+                yield chunk, {
+                    'url': content_data['url'],
+                    'title': content_data['title'],
+                    'chunk_id': i,
+                    'source': 'annisa.org',
+                    'chunk_hash': chunk_hash,
+                    # The "heading: " prefix the chunker added, so prompts can send it once per page
+                    'heading': heading
+                }, previous_vectors.get(chunk_hash)
+            
+            self.manifest.update(url, result['headers'], content_hash, hashes, result['links'])
+            print(f"Scraped: {url} (depth {result['depth']}, {result['elapsed']:.2f}s) → {len(text_chunks)} chunks")
         
-        # Create embeddings
-        self.embeddings = self.model.encode(self.chunks, show_progress_bar=True)
-        print(f"Created embeddings shape: {self.embeddings.shape}")
+        # Add Google Forms information
+        for text, meta in self.google_forms_chunks():
+            blocks = [('heading', meta['title'])] + [('text', line.strip()) for line in text.splitlines() if line.strip()]
+            for i, (heading, chunk) in enumerate(self.chunker.chunk_sections(blocks)):
+                chunk_hash = text_hash(chunk)
+                yield chunk, dict(meta, chunk_id=i, chunk_hash=chunk_hash, heading=heading), previous_vectors.get(chunk_hash)
+        print(f"✅ Added volunteer and DV assistance form information")
     
-    def save_knowledge_base(self):
-        """Save knowledge base to files."""
-        print("Saving knowledge base...")
+    def embed_and_append(self, writer: KnowledgeBaseWriter, batch: List[Tuple[str, Dict, Optional[int]]]):
+        """Stage 3: drop near-duplicates, embed the rest (re-using stored vectors) and append them to the store."""
+        if self.deduper is not None:
+            kept = []
+            for chunk, meta, row in batch:
+                duplicate_of = self.deduper.add(chunk, writer.count + len(kept))
+                if duplicate_of is None:
+                    kept.append((chunk, meta, row))
+                else:
+                    self.duplicate_urls.setdefault(duplicate_of, []).append(meta['url'])
+                    self.duplicates += 1
+            batch = kept
+            if not batch:
+                return
         
-        # Save the knowledge base
-        knowledge_base = {
-            'chunks': self.chunks,
-            'embeddings': self.embeddings,
-            'metadata': self.metadata
-        }
+        chunks = [chunk for chunk, _, _ in batch]
+        metadata = [meta for _, meta, _ in batch]
+        embeddings = np.zeros((len(batch), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
         
-        with open("data/knowledge_base.pkl", "wb") as f:
-            pickle.dump(knowledge_base, f)
+        reused = [i for i, (_, _, row) in enumerate(batch) if row is not None]
+        missing = [i for i, (_, _, row) in enumerate(batch) if row is None]
+        if reused:
+            embeddings[reused] = self.previous.embeddings[[batch[i][2] for i in reused]]
+        if missing:
+            embeddings[missing] = self.model.encode([chunks[i] for i in missing], batch_size=len(missing))
         
-        print(f"Knowledge base saved with {len(self.chunks)} chunks")
-        print("Knowledge base created successfully!")
+        writer.append(chunks, embeddings, metadata)
+        self.chunk_hashes.extend(meta['chunk_hash'] for meta in metadata)
+        self.chunk_urls.extend(meta['url'] for meta in metadata)
+        self.embedded += len(missing)
+        self.reused += len(reused)
     
-    def add_google_forms_info(self):
-        """Add information about important Google Forms that users should know about."""
+    def merge_duplicate_sources(self, writer: KnowledgeBaseWriter):
+        """Record every page a kept chunk appeared on in its metadata 'urls'."""
+        for row, urls in self.duplicate_urls.items():
+            writer.amend_metadata(row, lambda meta, urls=urls: dict(
+                meta, urls=list(dict.fromkeys([meta['url']] + urls))
+            ))
+    
+    def is_unchanged(self) -> bool:
+        """True when the ingested chunks, and the pages each one is sourced from, are exactly those already stored.
+
+        Comparing the merged sources too means a change in which pages carry a
+        duplicated chunk still publishes a new version with the updated 'urls'.
+        """
+        if self.previous is None or len(self.previous) != len(self.chunk_hashes):
+            return False
+        previous = [(meta.get('chunk_hash') or text_hash(chunk), sorted(set([meta['url']] + meta.get('urls', []))))
+                    for chunk, meta in zip(self.previous.chunks, self.previous.metadata)]
+        current = [(chunk_hash, sorted(set([url] + self.duplicate_urls.get(row, []))))
+                   for row, (chunk_hash, url) in enumerate(zip(self.chunk_hashes, self.chunk_urls))]
+        return sorted(previous) == sorted(current)
+    
+    def google_forms_chunks(self) -> List[Tuple[str, Dict]]:
+        """Information about important Google Forms that users should know about."""
         
         # Volunteer Form Information
         volunteer_form_text = """
@@ -229,61 +355,88 @@ class AnNisaContentIngester:
         """
         
         # Add these as chunks
-        self.chunks.append(volunteer_form_text.strip())
-        self.metadata.append({
-            'url': 'https://docs.google.com/forms/d/e/1FAIpQLSdska_omS24UValnvU5wlWxcQjI9TynfDbJJa9KkgbRUHvztA/viewform',
-            'title': 'An-Nisa Volunteer Application Form',
-            'type': 'volunteer_form'
-        })
-        
-        self.chunks.append(dv_assistance_text.strip())  
-        self.metadata.append({
-            'url': 'https://docs.google.com/forms/d/e/1FAIpQLSfA9R_H1KDM5AHDbZ82HczE8oq6XxpiH_Z17BK5PGwLdQBCjQ/viewform',
-            'title': 'An-Nisa Domestic Violence Assistance Form',
-            'type': 'assistance_form'
-        })
-        
-        print(f"✅ Added volunteer and DV assistance form information")
+        return [
+            (volunteer_form_text.strip(), {
+                'url': 'https://docs.google.com/forms/d/e/1FAIpQLSdska_omS24UValnvU5wlWxcQjI9TynfDbJJa9KkgbRUHvztA/viewform',
+                'title': 'An-Nisa Volunteer Application Form',
+                'type': 'volunteer_form'
+            }),
+            (dv_assistance_text.strip(), {
+                'url': 'https://docs.google.com/forms/d/e/1FAIpQLSfA9R_H1KDM5AHDbZ82HczE8oq6XxpiH_Z17BK5PGwLdQBCjQ/viewform',
+                'title': 'An-Nisa Domestic Violence Assistance Form',
+                'type': 'assistance_form'
+            }),
+        ]
 
-    def process_urls(self):
-        """Process all URLs and create knowledge base."""
-        print("🚀 Starting AnNisa.org content ingestion...")
-        print("=" * 60)
+    def process_urls(self) -> bool:
+        """Crawl, chunk, embed and store the knowledge base as one streaming pipeline.
         
-        # Process regular website pages using existing method
-        self.scrape_all_pages()
-        
-        # Add Google Forms information
-        self.add_google_forms_info()
-        
-        print(f"\n📊 INGESTION COMPLETE")
+        Fetching, parsing/chunking and embedding run as concurrent stages joined
+        by bounded queues; embedded batches are appended straight to the new
+        store version, so memory stays flat as the site grows.
+        """
+        print("🚀 Starting AnNisa.org content ingestion...")
         print("=" * 60)
-        print(f"✅ Total chunks created: {len(self.chunks)}")
-        print(f"📄 Total pages processed: {len(set(meta['url'] for meta in self.metadata))}")
         
-        if len(self.chunks) == 0:
-            print("❌ No content was extracted! Check the URLs and try again.")
-            return False
+        writer = KnowledgeBaseWriter(KB_ROOT, model_name=self.model_name)
+        try:
+            pages = threaded(self.crawl_pages(), PIPELINE_QUEUE_SIZE, name='ingest-fetch')
+            records = threaded(self.chunk_pages(pages), EMBED_BATCH_SIZE * 4, name='ingest-chunk')
+            for batch in batched(records, EMBED_BATCH_SIZE):
+                self.embed_and_append(writer, batch)
+                print(f"  → Stored {writer.count} chunks ({self.embedded} embedded, {self.reused} reused)")
+            
+            print(f"\n📊 INGESTION COMPLETE")
+            print("=" * 60)
+            print(f"✅ Total chunks created: {writer.count} ({self.duplicates} near-duplicates dropped)")
+            print(f"📄 Total pages processed: {self.pages_processed} ({self.pages_unchanged} unchanged)")
+            
+            if writer.count == 0:
+                print("❌ No content was extracted! Check the URLs and try again.")
+                writer.abort()
+                return False
+            
+            if self.is_unchanged():
+                writer.abort()
+                self.manifest.save()
+                print("\n✅ Site unchanged since the last ingest; knowledge base left as is.")
+                return True
+            
+            print("Saving knowledge base...")
+            self.merge_duplicate_sources(writer)
+            writer.finalize()
+            build_store_index(writer.path, INDEX_KIND, **index_params_from_env(INDEX_KIND))
+            build_store_bm25(writer.path)
+            version = writer.publish()
+        except BaseException:
+            writer.abort()
+            raise
         
+        self.manifest.save()
+        print(f"Knowledge base saved with {writer.count} chunks (version {version}, {INDEX_KIND} index)")
+        print("Knowledge base created successfully!")
         return True
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Crawl AnNisa.org and build the chatbot knowledge base.")
+    parser.add_argument('--full', action='store_true',
+                        help='ignore the previous crawl and re-embed everything')
+    args = parser.parse_args()
+    
     # Create data directory
     os.makedirs("data", exist_ok=True)
     
     # Initialize scraper
-    scraper = AnNisaContentIngester()
+    scraper = AnNisaContentIngester(incremental=not args.full)
     
-    # Process all content
+    # Crawl, embed and save
     success = scraper.process_urls()
     
     if not success:
         print("❌ Failed to create knowledge base!")
         exit(1)
     
-    # Create embeddings and save
-    scraper.create_embeddings()
-    scraper.save_knowledge_base()
-    
     print("\nIngestion complete! Knowledge base ready for chatbot.")
-    print("Knowledge base saved as ./data/knowledge_base.pkl") 
\ No newline at end of file
+    print(f"Knowledge base saved under ./{KB_ROOT}")
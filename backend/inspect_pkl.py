@@ -1,37 +1,41 @@
 #!/usr/bin/env python3
 """
-Script to inspect the contents of the knowledge base PKL file.
+Script to inspect the contents of the knowledge base store.
 Shows what data is actually stored and how it's structured.
+Reads the memory-mapped store under data/kb, or the legacy PKL file.
 """
 
-import pickle
 import numpy as np
 import os
 
+from kb_store import KB_ROOT, knowledge_base_exists, open_knowledge_base
+
+def _store_size(path):
+    """Total size in bytes of a store directory or legacy pickle file."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
 def inspect_knowledge_base():
     """Inspect and display knowledge base contents."""
-    pkl_path = "data/knowledge_base.pkl"
-    
-    if not os.path.exists(pkl_path):
-        print(f"❌ Knowledge base not found at {pkl_path}")
+    if not knowledge_base_exists():
+        print(f"❌ Knowledge base not found in {KB_ROOT}")
         print("Run ingest.py first to create it!")
         return
     
-    print(f"🔍 Inspecting: {pkl_path}")
-    print("=" * 60)
-    
     try:
-        # Load the PKL file
-        with open(pkl_path, "rb") as f:
-            knowledge_base = pickle.load(f)
+        store = open_knowledge_base()
+        
+        print(f"🔍 Inspecting: {store.path}")
+        print("=" * 60)
         
         print("📦 KNOWLEDGE BASE STRUCTURE:")
-        print(f"   Type: {type(knowledge_base)}")
-        print(f"   Keys: {list(knowledge_base.keys())}")
+        for key, value in store.manifest.items():
+            print(f"   {key}: {value}")
         print()
         
         # Inspect chunks
-        chunks = knowledge_base.get('chunks', [])
+        chunks = store.chunks
         print(f"📝 CHUNKS ({len(chunks)} total):")
         for i, chunk in enumerate(chunks[:3]):  # Show first 3
             print(f"   [{i}] Length: {len(chunk)} chars")
@@ -41,9 +45,9 @@ def inspect_knowledge_base():
         print()
         
         # Inspect embeddings
-        embeddings = knowledge_base.get('embeddings', [])
+        embeddings = store.embeddings
         if len(embeddings) > 0:
-            embeddings_array = np.array(embeddings)
+            embeddings_array = np.asarray(embeddings)
             print(f"🧠 EMBEDDINGS:")
             print(f"   Shape: {embeddings_array.shape}")
             print(f"   Type: {embeddings_array.dtype}")
@@ -52,7 +56,7 @@ def inspect_knowledge_base():
         print()
         
         # Inspect metadata
-        metadata = knowledge_base.get('metadata', [])
+        metadata = store.metadata
         print(f"📊 METADATA ({len(metadata)} entries):")
         for i, meta in enumerate(metadata[:3]):  # Show first 3
             print(f"   [{i}] {meta}")
@@ -62,29 +66,27 @@ def inspect_knowledge_base():
         
         # Summary statistics
         print("📈 SUMMARY STATISTICS:")
-        if chunks:
+        if len(chunks):
             avg_chunk_length = sum(len(chunk) for chunk in chunks) / len(chunks)
             print(f"   Average chunk length: {avg_chunk_length:.1f} characters")
         
-        if embeddings:
-            print(f"   Embedding dimensions: {len(embeddings[0])}")
+        if len(embeddings):
+            print(f"   Embedding dimensions: {embeddings.shape[1]}")
             print(f"   Total vectors: {len(embeddings)}")
         
         # File size
-        file_size = os.path.getsize(pkl_path)
+        file_size = _store_size(store.path)
         print(f"   File size: {file_size / 1024 / 1024:.2f} MB")
         
         print("=" * 60)
         print("✅ Knowledge base inspection complete!")
         
     except Exception as e:
-        print(f"❌ Error reading PKL file: {e}")
+        print(f"❌ Error reading knowledge base: {e}")
 
 def test_similarity_search():
     """Test how similarity search works with the data."""
-    pkl_path = "data/knowledge_base.pkl"
-    
-    if not os.path.exists(pkl_path):
+    if not knowledge_base_exists():
         print("❌ No knowledge base to test with!")
         return
     
@@ -93,35 +95,31 @@ def test_similarity_search():
     
     try:
         from sentence_transformers import SentenceTransformer
-        from sklearn.metrics.pairwise import cosine_similarity
+        from retrieval import normalize_rows, search_dense
         
         # Load knowledge base
-        with open(pkl_path, "rb") as f:
-            kb = pickle.load(f)
+        store = open_knowledge_base()
         
-        chunks = kb['chunks']
-        embeddings = np.array(kb['embeddings'])
-        metadata = kb['metadata']
+        chunks = store.chunks
+        embeddings = store.embeddings
+        metadata = store.metadata
         
         # Load the same model used for embeddings
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        model = SentenceTransformer(store.manifest.get('model') or 'paraphrase-MiniLM-L3-v2')
         
         # Test query
         test_query = "What does AnNisa do?"
         print(f"🔍 Test Query: \"{test_query}\"")
         
         # Embed the query
-        query_embedding = model.encode([test_query])
-        
-        # Calculate similarities
-        similarities = cosine_similarity(query_embedding, embeddings)[0]
+        query_embedding = normalize_rows(model.encode([test_query]))
         
-        # Get top 3 matches
-        top_indices = np.argsort(similarities)[-3:][::-1]
+        # Get top 3 matches by cosine similarity
+        top_indices, top_scores = search_dense(embeddings, query_embedding, 3)
         
         print(f"\n📋 TOP 3 MATCHES:")
-        for i, idx in enumerate(top_indices):
-            print(f"\n   [{i+1}] Similarity Score: {similarities[idx]:.4f}")
+        for i, (idx, score) in enumerate(zip(top_indices[0], top_scores[0])):
+            print(f"\n   [{i+1}] Similarity Score: {score:.4f}")
             print(f"       Source: {metadata[idx]['url']}")
             print(f"       Content: \"{chunks[idx][:200]}...\"")
         
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Immutable, swappable view of one knowledge base version for serving.
+
+Everything a query needs (chunks, metadata, embeddings, vector index, BM25
+index) hangs off a single KnowledgeBaseSnapshot. A request reads the
+chatbot's snapshot reference once and uses it throughout, so publishing a
+new ingest only means loading and warming a new snapshot in the background
+and replacing that reference: in-flight queries finish on the old version,
+whose memory maps are released when the last reference goes away.
+
+KnowledgeBaseWatcher polls the store's CURRENT pointer and triggers the swap
+in every worker process.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from kb_store import KB_ROOT, current_version, open_knowledge_base
+from sparse_index import BM25Index
+from vector_index import load_index, search_params_from_env
+
+logger = logging.getLogger(__name__)
+
+
+class KnowledgeBaseSnapshot:
+    """One loaded knowledge base version and its indexes."""
+
+    def __init__(self, store=None, index=None, bm25: Optional[BM25Index] = None):
+        self.store = store
+        self.index = index
+        self.bm25 = bm25
+        self.loaded_at = time.time()
+
+    @classmethod
+    def empty(cls) -> "KnowledgeBaseSnapshot":
+        return cls()
+
+    @classmethod
+    def load(cls, root: str = KB_ROOT, hybrid: bool = True) -> "KnowledgeBaseSnapshot":
+        """Open the current store version with its vector (and BM25) index."""
+        store = open_knowledge_base(root)
+        # Search-time knobs (IVF_NPROBE, HNSW_EF_SEARCH, INDEX_RERANK) override the persisted ones;
+        # build knobs such as IVF_NLIST only take effect at the next ingest
+        index = load_index(store.path, store.embeddings)
+        index.set_params(**search_params_from_env(index.kind))
+        bm25 = None
+        if hybrid:
+            # Stores written before the keyword index get one built in memory
+            bm25 = (BM25Index.load(store.path) if store.path else None) or BM25Index.build(store.chunks)
+        return cls(store, index, bm25)
+
+    @property
+    def chunks(self):
+        return self.store.chunks if self.store is not None else []
+
+    @property
+    def embeddings(self):
+        return self.store.embeddings if self.store is not None else None
+
+    @property
+    def metadata(self):
+        return self.store.metadata if self.store is not None else []
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.store.version if self.store is not None else None
+
+    @property
+    def model(self) -> str:
+        return self.store.manifest.get("model", "") if self.store is not None else ""
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def warm(self, query_embedding: Optional[np.ndarray] = None):
+        """Fault in what the index scans (codes only for compressed indexes) and exercise it once."""
+        if self.store is None or len(self) == 0:
+            return
+        self.index.warm()
+        if query_embedding is not None:
+            self.index.search(query_embedding, 1)
+
+
+class KnowledgeBaseWatcher:
+    """Poll the store's CURRENT pointer and call `on_change` when it moves.
+
+    The polling thread is started lazily and once per process, since threads
+    do not survive the fork into gunicorn workers.
+    """
+
+    def __init__(self, on_change: Callable[[], None], root: str = KB_ROOT, interval: float = 10.0):
+        self.on_change = on_change
+        self.root = root
+        self.interval = interval
+        self._seen = current_version(root)
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def ensure_started(self):
+        if not self.enabled or (self._thread_pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='kb-watcher', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            version = current_version(self.root)
+            if version is None or version == self._seen:
+                continue
+            try:
+                self.on_change()
+                self._seen = version
+            except Exception as e:
+                # Retried on the next poll
+                logger.error(f"Knowledge base reload failed: {e}")
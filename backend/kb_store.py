@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+On-disk knowledge base store for the AnNisa.org chatbot.
+
+Replaces the single pickle with a versioned directory layout that can be
+memory-mapped instead of unpickled, so gunicorn workers forked from a preloaded
+master share the same page-cache pages and startup cost does not grow with the
+corpus:
+
+    data/kb/
+        CURRENT                 # name of the active version directory
+        <version>/
+            manifest.json       # format version, counts, dim, dtype, model
+            embeddings.f32      # flat float32 matrix, row-major (count x dim),
+                                # rows L2-normalized at write time
+            chunks.bin          # concatenated UTF-8 chunk texts
+            chunks.idx          # uint64 offsets into chunks.bin (count + 1)
+            metadata.bin        # concatenated UTF-8 JSON metadata records
+            metadata.idx        # uint64 offsets into metadata.bin (count + 1)
+"""
+
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from retrieval import normalize_rows
+
+FORMAT_NAME = "annisa-kb"
+FORMAT_VERSION = 1
+
+KB_ROOT = os.environ.get("KB_PATH", "data/kb")
+LEGACY_PICKLE_PATH = "data/knowledge_base.pkl"
+
+EMBEDDINGS_FILE = "embeddings.f32"
+CHUNKS_FILE = "chunks.bin"
+CHUNKS_INDEX_FILE = "chunks.idx"
+METADATA_FILE = "metadata.bin"
+METADATA_INDEX_FILE = "metadata.idx"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+
+def _map_bytes(path: str) -> np.ndarray:
+    """Memory-map a file as read-only bytes (np.memmap rejects empty files)."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+def _map_offsets(path: str) -> np.ndarray:
+    return np.fromfile(path, dtype=np.uint64)
+
+
+class StringTable:
+    """Read-only sequence of strings backed by a byte blob and an offset array."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return max(len(self._offsets) - 1, 0)
+
+    def _get(self, idx: int) -> str:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("StringTable index out of range")
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._get(i) for i in range(*idx.indices(len(self)))]
+        return self._get(int(idx))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get(i)
+
+
+class RecordTable(StringTable):
+    """Read-only sequence of JSON records stored like a StringTable."""
+
+    def _get(self, idx: int) -> Dict:
+        return json.loads(super()._get(idx))
+
+
+class KnowledgeBaseWriter:
+    """Write a new knowledge base version, appending chunks as they arrive.
+
+    Nothing becomes visible to readers until commit() atomically repoints
+    CURRENT at the new version directory.
+    """
+
+    def __init__(self, root: str = KB_ROOT, model_name: str = "", extra: Optional[Dict] = None):
+        self.root = root
+        self.version = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.path = os.path.join(root, self.version)
+        self.model_name = model_name
+        self.extra = dict(extra or {})
+        self.count = 0
+        self.dim = None
+
+        os.makedirs(self.path, exist_ok=True)
+        self._embeddings = open(os.path.join(self.path, EMBEDDINGS_FILE), "wb")
+        self._chunks = open(os.path.join(self.path, CHUNKS_FILE), "wb")
+        self._metadata = open(os.path.join(self.path, METADATA_FILE), "wb")
+        self._chunk_offsets = [0]
+        self._metadata_offsets = [0]
+        self._amendments = {}
+
+    def append(self, chunks: List[str], embeddings: np.ndarray, metadata: List[Dict]):
+        """Append a batch of chunks with their embeddings and metadata."""
+        embeddings = np.ascontiguousarray(normalize_rows(embeddings))
+        if embeddings.ndim != 2 or not (len(chunks) == len(metadata) == embeddings.shape[0]):
+            raise ValueError("chunks, embeddings and metadata must have matching lengths")
+        if self.dim is None:
+            self.dim = int(embeddings.shape[1])
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {embeddings.shape[1]} does not match store dim {self.dim}")
+
+        self._embeddings.write(embeddings.tobytes())
+        for chunk, meta in zip(chunks, metadata):
+            data = chunk.encode("utf-8")
+            self._chunks.write(data)
+            self._chunk_offsets.append(self._chunk_offsets[-1] + len(data))
+
+            data = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._metadata.write(data)
+            self._metadata_offsets.append(self._metadata_offsets[-1] + len(data))
+
+        self.count += len(chunks)
+
+    def amend_metadata(self, row: int, fn: Callable[[Dict], Dict]):
+        """Rewrite an already appended metadata record with fn(record) at finalize()."""
+        if not 0 <= row < self.count:
+            raise IndexError(f"Row {row} has not been appended")
+        self._amendments.setdefault(row, []).append(fn)
+
+    def _apply_amendments(self):
+        metadata_path = os.path.join(self.path, METADATA_FILE)
+        offsets = self._metadata_offsets
+        with open(metadata_path, "rb") as f:
+            data = f.read()
+        new_offsets = [0]
+        with open(metadata_path, "wb") as f:
+            for row in range(self.count):
+                record = data[offsets[row]:offsets[row + 1]]
+                if row in self._amendments:
+                    meta = json.loads(record.decode("utf-8"))
+                    for fn in self._amendments[row]:
+                        meta = fn(meta)
+                    record = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                f.write(record)
+                new_offsets.append(new_offsets[-1] + len(record))
+        self._metadata_offsets = new_offsets
+
+    def finalize(self):
+        """Write offsets and manifest; the version is complete but not yet CURRENT.
+
+        Derived artifacts (e.g. a vector index) can be added to self.path
+        between finalize() and publish().
+        """
+        for f in (self._embeddings, self._chunks, self._metadata):
+            f.close()
+        if self._amendments:
+            # Metadata is small next to the embeddings; rewriting it once is cheap
+            self._apply_amendments()
+
+        np.asarray(self._chunk_offsets, dtype=np.uint64).tofile(os.path.join(self.path, CHUNKS_INDEX_FILE))
+        np.asarray(self._metadata_offsets, dtype=np.uint64).tofile(os.path.join(self.path, METADATA_INDEX_FILE))
+
+        manifest = {
+            "format": FORMAT_NAME,
+            "format_version": FORMAT_VERSION,
+            "version": self.version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "count": self.count,
+            "dim": self.dim or 0,
+            "dtype": "float32",
+            "normalized": True,
+            "model": self.model_name,
+        }
+        manifest.update(self.extra)
+        with open(os.path.join(self.path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    def publish(self, keep: int = 2) -> str:
+        """Atomically make this version CURRENT and prune old versions."""
+        tmp_current = os.path.join(self.root, CURRENT_FILE + ".tmp")
+        with open(tmp_current, "w", encoding="utf-8") as f:
+            f.write(self.version)
+        os.replace(tmp_current, os.path.join(self.root, CURRENT_FILE))
+
+        prune_versions(self.root, keep=keep)
+        return self.version
+
+    def commit(self, keep: int = 2) -> str:
+        """Finalize the version, make it CURRENT and prune old versions."""
+        self.finalize()
+        return self.publish(keep=keep)
+
+    def abort(self):
+        """Discard a partially written version."""
+        for f in (self._embeddings, self._chunks, self._metadata):
+            if not f.closed:
+                f.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class KnowledgeBaseStore:
+    """A loaded knowledge base version: chunks, metadata and embeddings."""
+
+    def __init__(self, chunks, embeddings: np.ndarray, metadata, manifest: Dict, path: Optional[str] = None):
+        if not manifest.get("normalized") and len(embeddings):
+            # Older stores and pickles hold raw encoder output; normalize once here
+            # so every query is a plain dot product.
+            embeddings = normalize_rows(embeddings)
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.metadata = metadata
+        self.manifest = manifest
+        self.path = path
+
+    @property
+    def version(self) -> str:
+        return self.manifest.get("version", "")
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @classmethod
+    def open(cls, root: str = KB_ROOT, version: Optional[str] = None) -> "KnowledgeBaseStore":
+        """Memory-map a stored version (the CURRENT one by default)."""
+        if version is None:
+            version = current_version(root)
+            if version is None:
+                raise FileNotFoundError(f"No knowledge base found in {root}")
+        path = os.path.join(root, version)
+
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path} is not an {FORMAT_NAME} store")
+        if manifest.get("format_version", 0) > FORMAT_VERSION:
+            raise ValueError(f"Unsupported knowledge base format version {manifest['format_version']}")
+
+        count, dim = manifest["count"], manifest["dim"]
+        if count and dim:
+            embeddings = np.memmap(os.path.join(path, EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(count, dim))
+        else:
+            embeddings = np.zeros((0, dim), dtype=np.float32)
+
+        chunks = StringTable(_map_bytes(os.path.join(path, CHUNKS_FILE)),
+                             _map_offsets(os.path.join(path, CHUNKS_INDEX_FILE)))
+        metadata = RecordTable(_map_bytes(os.path.join(path, METADATA_FILE)),
+                               _map_offsets(os.path.join(path, METADATA_INDEX_FILE)))
+        return cls(chunks, embeddings, metadata, manifest, path)
+
+    @classmethod
+    def from_pickle(cls, pkl_path: str = LEGACY_PICKLE_PATH) -> "KnowledgeBaseStore":
+        """Load a legacy knowledge_base.pkl fully into memory."""
+        with open(pkl_path, "rb") as f:
+            knowledge_base = pickle.load(f)
+        embeddings = np.asarray(knowledge_base["embeddings"], dtype=np.float32)
+        manifest = {
+            "format": "pickle",
+            "version": "legacy-%d" % int(os.path.getmtime(pkl_path)),
+            "count": len(knowledge_base["chunks"]),
+            "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+            "dtype": "float32",
+        }
+        return cls(knowledge_base["chunks"], embeddings, knowledge_base["metadata"], manifest, pkl_path)
+
+
+def current_version(root: str = KB_ROOT) -> Optional[str]:
+    """Return the name of the active version, or None if there is no store."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def knowledge_base_exists(root: str = KB_ROOT, legacy_path: str = LEGACY_PICKLE_PATH) -> bool:
+    return current_version(root) is not None or os.path.exists(legacy_path)
+
+
+def open_knowledge_base(root: str = KB_ROOT, legacy_path: str = LEGACY_PICKLE_PATH) -> KnowledgeBaseStore:
+    """Open the memory-mapped store, falling back to the legacy pickle."""
+    if current_version(root) is not None:
+        return KnowledgeBaseStore.open(root)
+    if os.path.exists(legacy_path):
+        return KnowledgeBaseStore.from_pickle(legacy_path)
+    raise FileNotFoundError(f"No knowledge base found in {root} or {legacy_path}")
+
+
+def save_knowledge_base(chunks: List[str], embeddings, metadata: List[Dict],
+                        root: str = KB_ROOT, model_name: str = "", extra: Optional[Dict] = None,
+                        index_kind: str = "flat", index_params: Optional[Dict] = None) -> str:
+    """Write a complete knowledge base as a new version and make it current.
+
+    A vector index of `index_kind` over the stored embeddings and a BM25
+    keyword index over the chunks are persisted in the same version directory
+    before it is published.
+    """
+    writer = KnowledgeBaseWriter(root, model_name=model_name, extra=extra)
+    try:
+        if len(chunks):
+            writer.append(list(chunks), embeddings, list(metadata))
+        writer.finalize()
+        build_store_index(writer.path, index_kind, **(index_params or {}))
+        build_store_bm25(writer.path)
+        return writer.publish()
+    except Exception:
+        writer.abort()
+        raise
+
+
+def build_store_index(path: str, kind: str = "flat", **params):
+    """Build and persist a vector index for a finalized store version."""
+    from vector_index import build_index
+
+    root, version = os.path.split(os.path.normpath(path))
+    store = KnowledgeBaseStore.open(root, version=version)
+    index = build_index(kind, store.embeddings, **params)
+    index.save(path)
+    return index
+
+
+def build_store_bm25(path: str, **params):
+    """Build and persist the BM25 keyword index for a finalized store version."""
+    from sparse_index import BM25Index
+
+    root, version = os.path.split(os.path.normpath(path))
+    store = KnowledgeBaseStore.open(root, version=version)
+    index = BM25Index.build(store.chunks, **params)
+    index.save(path)
+    return index
+
+
+def list_versions(root: str = KB_ROOT) -> Iterable[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+
+def prune_versions(root: str = KB_ROOT, keep: int = 2):
+    """Delete all but the newest `keep` versions, never touching CURRENT.
+
+    Workers that still have an old version mapped keep reading it safely;
+    the pages are released once the last mapping goes away.
+    """
+    active = current_version(root)
+    versions = [v for v in list_versions(root) if v != active]
+    for version in versions[:max(len(versions) - (keep - 1), 0)]:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # Convert an existing knowledge_base.pkl into the memory-mapped format.
+    store = KnowledgeBaseStore.from_pickle(LEGACY_PICKLE_PATH)
+    version = save_knowledge_base(list(store.chunks), store.embeddings, list(store.metadata),
+                                  model_name="paraphrase-MiniLM-L3-v2")
+    print(f"✅ Converted {LEGACY_PICKLE_PATH} → {os.path.join(KB_ROOT, version)} ({len(store)} chunks)")
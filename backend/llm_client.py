@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Chat completions client with pooled connections, deadlines, retries, hedging
+and a circuit breaker.
+
+The module-global `openai` 0.28 client opened connections with no timeout and
+no retry policy, so a slow or failing provider tied up request threads until
+gunicorn killed them. LLMClient talks to the chat completions REST API
+directly over a per-process `requests` session:
+
+- every call has a deadline (LLM_TIMEOUT); each attempt's read timeout is
+  whatever is left of it,
+- 429, 5xx and connection errors are retried with full-jitter exponential
+  backoff (honouring Retry-After) while the deadline allows,
+- optionally, a second identical request is fired if the first has not
+  answered after the hedge delay (fixed, or the observed p95) and the first
+  answer wins,
+- after LLM_BREAKER_FAILURES consecutive failed calls the circuit opens and
+  calls fail fast with CircuitOpenError for LLM_BREAKER_RESET seconds, after
+  which a single trial call decides whether it closes again.
+
+OPENAI_API_BASE points the client at any compatible server, such as
+bench.llm_stub.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_BASE = 'https://api.openai.com/v1'
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+# Observed latencies needed before an "auto" hedge delay is trusted
+HEDGE_MIN_SAMPLES = 20
+
+LLM_RETRIES = metrics.REGISTRY.counter('annisa_llm_retries_total', 'Retried OpenAI attempts by reason')
+LLM_HEDGES = metrics.REGISTRY.counter('annisa_llm_hedges_total', 'Hedged OpenAI requests by outcome (fired, won)')
+
+
+class LLMError(Exception):
+    """A chat completion failed; `retryable` marks provider-side failures (429, 5xx, network)."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    """The provider has been failing; calls are refused until the breaker's reset timeout."""
+
+    def __init__(self, message: str = "LLM circuit breaker is open"):
+        super().__init__(message, retryable=True)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one trial call) -> closed."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or 0 < self.failure_threshold <= self.failures:
+                if self.opened_at is None:
+                    logger.warning(f"LLM circuit breaker opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class Completion:
+    def __init__(self, text: str, usage: Optional[Dict] = None, hedged: bool = False):
+        self.text = text
+        self.usage = usage or {}
+        self.hedged = hedged
+
+
+class LLMClient:
+    """Chat completions over a pooled HTTP session with deadlines, retries, hedging and a breaker."""
+
+    def __init__(self, api_key: str, api_base: str = DEFAULT_API_BASE, model: str = 'gpt-4',
+                 timeout: float = 30.0, connect_timeout: float = 3.05, max_retries: int = 2,
+                 backoff_base: float = 0.25, backoff_max: float = 4.0, hedge_delay: Optional[str] = None,
+                 pool_size: int = 32, breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # None/"off", "auto" (observed p95) or a number of seconds
+        self.hedge_delay = None if hedge_delay in (None, '', '0', 'off') else hedge_delay
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=200)
+        self._session = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMClient"]:
+        """Client configured from the environment, or None without OPENAI_API_KEY."""
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            return None
+        return cls(
+            api_key,
+            api_base=os.getenv('OPENAI_API_BASE', DEFAULT_API_BASE),
+            model=os.getenv('LLM_MODEL', 'gpt-4'),
+            timeout=float(os.getenv('LLM_TIMEOUT', '30')),
+            connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', '3.05')),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+            hedge_delay=os.getenv('LLM_HEDGE_DELAY', 'off').lower(),
+            pool_size=int(os.getenv('LLM_POOL_SIZE', os.getenv('GUNICORN_THREADS', '32'))),
+            breaker=CircuitBreaker(int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+                                   float(os.getenv('LLM_BREAKER_RESET', '30'))),
+        )
+
+    def _resources(self):
+        """Per-process session and hedging pool, created lazily so they are never inherited across fork."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'Authorization': f'Bearer {self.api_key}',
+                                            'Content-Type': 'application/json'})
+                    self._session = session
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='llm')
+                    self._pid = os.getpid()
+        return self._session, self._executor
+
+    def stats(self) -> Dict:
+        latencies = sorted(self._latencies)
+        return {
+            "model": self.model,
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "hedge_delay_s": self.current_hedge_delay(),
+            "p95_s": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+        }
+
+    def current_hedge_delay(self) -> Optional[float]:
+        if self.hedge_delay is None:
+            return None
+        if self.hedge_delay != 'auto':
+            return float(self.hedge_delay)
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95)]
+
+    def complete(self, messages: List[Dict], max_tokens: int = 500, temperature: float = 0.7,
+                 timeout: Optional[float] = None) -> Completion:
+        """One chat completion within `timeout` seconds (LLM_TIMEOUT by default)."""
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens,
+                   'temperature': temperature}
+        deadline = time.monotonic() + (timeout or self.timeout)
+        return self._with_retries(lambda: self._hedged(payload, deadline), deadline)
+
+    def stream(self, messages: List[Dict], max_tokens: int = 500, temperature: float = 0.7,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """Yield content deltas. Retries happen only until the first delta has been received."""
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens,
+                   'temperature': temperature, 'stream': True}
+        deadline = time.monotonic() + (timeout or self.timeout)
+        response = self._with_retries(lambda: self._post(payload, deadline, stream=True), deadline)
+        failed = True
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if time.monotonic() > deadline:
+                    raise LLMError("LLM stream exceeded its deadline", retryable=True)
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                if delta:
+                    yield delta
+            failed = False
+        except GeneratorExit:
+            # The caller stopped reading; the provider was fine
+            failed = False
+            raise
+        except requests.RequestException as e:
+            raise LLMError(f"LLM stream interrupted: {e}", retryable=True) from e
+        finally:
+            response.close()
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+    def _with_retries(self, call, deadline: float):
+        if not self.breaker.allow():
+            raise CircuitOpenError()
+        attempt = 0
+        while True:
+            try:
+                result = call()
+                if not isinstance(result, requests.Response):
+                    # Streams report to the breaker once they have been read
+                    self.breaker.record_success()
+                return result
+            except LLMError as e:
+                remaining = deadline - time.monotonic()
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if not e.retryable:
+                    # The provider answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                if attempt >= self.max_retries or delay >= remaining:
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                LLM_RETRIES.inc(reason=str(e.status or 'network'))
+                logger.warning(f"LLM call failed ({e}); retry {attempt} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _hedged(self, payload: Dict, deadline: float) -> Completion:
+        """Send the request; if it is still pending after the hedge delay, send a copy and take the first answer."""
+        hedge_delay = self.current_hedge_delay()
+        if hedge_delay is None or hedge_delay >= deadline - time.monotonic():
+            return self._request(payload, deadline)
+
+        _, executor = self._resources()
+        primary = executor.submit(self._request, payload, deadline)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        LLM_HEDGES.inc(outcome='fired')
+        hedge = executor.submit(self._request, payload, deadline)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    completion = future.result()
+                except LLMError as e:
+                    error = e
+                    continue
+                if future is hedge:
+                    LLM_HEDGES.inc(outcome='won')
+                # The slower request finishes in the background and is discarded
+                completion.hedged = True
+                return completion
+        raise error or LLMError("LLM call exceeded its deadline", retryable=True)
+
+    def _request(self, payload: Dict, deadline: float) -> Completion:
+        start = time.monotonic()
+        response = self._post(payload, deadline)
+        try:
+            body = response.json()
+            text = body['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Malformed LLM response: {e}", retryable=True) from e
+        finally:
+            response.close()
+        self._latencies.append(time.monotonic() - start)
+        return Completion(text, body.get('usage'))
+
+    def _post(self, payload: Dict, deadline: float, stream: bool = False) -> requests.Response:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("LLM call exceeded its deadline", retryable=True)
+        session, _ = self._resources()
+        try:
+            response = session.post(f"{self.api_base}/chat/completions", data=json.dumps(payload),
+                                    timeout=(min(self.connect_timeout, remaining), remaining), stream=stream)
+        except requests.Timeout as e:
+            raise LLMError(f"LLM request timed out: {e}", retryable=True) from e
+        except requests.RequestException as e:
+            raise LLMError(f"LLM request failed: {e}", retryable=True) from e
+
+        if response.status_code != 200:
+            retry_after = response.headers.get('Retry-After')
+            try:
+                message = response.json().get('error', {}).get('message', response.reason)
+            except ValueError:
+                message = response.reason
+            response.close()
+            raise LLMError(f"LLM returned {response.status_code}: {message}", status=response.status_code,
+                           retryable=response.status_code in RETRYABLE_STATUS,
+                           retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+In-process latency histograms and counters, rendered in the Prometheus text format.
+
+`span(stage)` times one stage of a request (query encoding, similarity scan,
+prompt assembly, the OpenAI call, ...). Each span is recorded in a
+histogram labelled by stage and, while a request is being timed, in a
+per-request list for the X-Timing response header. Recording is a
+perf_counter pair, a bisect and a short locked update, a few microseconds
+per span.
+
+Metrics live in each process; with several gunicorn workers every scrape
+sees the worker that answered it (scrape per worker or aggregate in
+Prometheus by instance).
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+# Seconds; spans range from sub-millisecond cache hits to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with sum and count, optionally split by labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # Per label set: [bucket counts (non-cumulative, last is +Inf), sum, count]
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge (or counter) read from a callback at scrape time, e.g. cache stats."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], object], kind: str = 'gauge',
+                 label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+        # With a label, `read` returns {label value: number}
+        self.label = label
+
+    def samples(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        if self.label:
+            return [f"{self.name}{_format_labels(((self.label, str(k)),))} {_format_value(v)}"
+                    for k, v in value.items()]
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def gauge_callback(self, name: str, help: str, read: Callable[[], object], kind: str = 'gauge',
+                       label: Optional[str] = None) -> GaugeCallback:
+        return self._register(GaugeCallback(name, help, read, kind, label))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # A broken callback must not take the whole scrape down
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'annisa_stage_seconds', 'Time spent in each stage of answering a query')
+REQUEST_SECONDS = REGISTRY.histogram(
+    'annisa_request_seconds', 'End-to-end HTTP request latency by endpoint')
+REQUESTS = REGISTRY.counter(
+    'annisa_requests_total', 'HTTP requests by endpoint and status code')
+LLM_TOKENS = REGISTRY.counter(
+    'annisa_llm_tokens_total', 'OpenAI tokens by kind (prompt, completion)')
+LLM_ERRORS = REGISTRY.counter(
+    'annisa_llm_errors_total', 'Failed OpenAI calls')
+
+_local = threading.local()
+
+
+def begin_request():
+    """Start collecting this thread's spans for the X-Timing header."""
+    _local.timings = []
+
+
+def end_request() -> List[Tuple[str, float]]:
+    """Stop collecting and return this request's (stage, seconds) spans in order."""
+    timings = getattr(_local, 'timings', None) or []
+    _local.timings = None
+    return timings
+
+
+def record(stage: str, seconds: float):
+    """Record an externally measured stage duration."""
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as `stage`."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Format spans like Server-Timing: "encode;dur=3.12, search;dur=0.41" (milliseconds)."""
+    return ', '.join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime backend for the query encoder.
+
+Serving only needs to embed short queries, which does not justify loading
+full PyTorch. This module exports paraphrase-MiniLM-L3-v2 to ONNX once (with
+dynamic int8 weight quantization) and runs it with onnxruntime plus the fast
+Rust tokenizer, reproducing the SentenceTransformer mean pooling so the
+vectors stay compatible with the existing knowledge base embeddings.
+
+    python onnx_encoder.py export   # needs requirements.txt + requirements-onnx.txt
+    python onnx_encoder.py parity   # exits non-zero unless it matches the PyTorch model
+
+Serve with ENCODER_BACKEND=onnx (see requirements-onnx.txt).
+"""
+
+import argparse
+import os
+import sys
+from typing import List
+
+import numpy as np
+
+DEFAULT_MODEL_NAME = 'paraphrase-MiniLM-L3-v2'
+DEFAULT_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR', f'data/onnx/{DEFAULT_MODEL_NAME}')
+MODEL_FILE = 'model.onnx'
+QUANTIZED_MODEL_FILE = 'model.int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+
+# Minimum cosine similarity between ONNX and PyTorch embeddings of the same text
+PARITY_THRESHOLD = 0.99
+
+PARITY_SENTENCES = [
+    "How do I volunteer?",
+    "donate",
+    "food pantry hours",
+    "What does An-Nisa Hope Center do?",
+    "I need help with domestic violence, who can I talk to confidentially?",
+    "Do you offer mental health counseling for women and families in Houston?",
+    "ECRF emergency relief fund application",
+    "Where can I find your contact information and office address?",
+]
+
+
+class OnnxEncoder:
+    """Drop-in replacement for SentenceTransformer.encode on short texts."""
+
+    def __init__(self, model_dir: str = DEFAULT_MODEL_DIR, quantized: bool = True,
+                 max_seq_length: int = 128, num_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+        self.max_seq_length = max_seq_length
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Mean-pooled embeddings, shape (len(sentences), dim), float32."""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            encodings = self.tokenizer.encode_batch(list(sentences[start:start + batch_size]))
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+            if 'token_type_ids' in self.input_names:
+                feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            outputs.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        embeddings = np.vstack(outputs).astype(np.float32) if outputs else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def export_onnx(model_name: str = DEFAULT_MODEL_NAME, model_dir: str = DEFAULT_MODEL_DIR, opset: int = 14):
+    """Export the transformer to ONNX, quantize it to int8 and save the fast tokenizer."""
+    import onnx
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(model_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    dummy = tokenizer(["An-Nisa Hope Center"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['token_embeddings'] = {0: 'batch', 1: 'sequence'}
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    model_path = os.path.join(model_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            tuple(dummy[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    onnx.checker.check_model(model_path)
+    quantize_dynamic(model_path, os.path.join(model_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+    tokenizer.backend_tokenizer.save(os.path.join(model_dir, TOKENIZER_FILE))
+    print(f"✅ Exported {model_name} to {model_dir} (max_seq_length={st_model.max_seq_length})")
+
+
+def check_parity(model_name: str = DEFAULT_MODEL_NAME, model_dir: str = DEFAULT_MODEL_DIR,
+                 sentences: List[str] = None, quantized: bool = True) -> float:
+    """Return the minimum cosine similarity between ONNX and PyTorch embeddings."""
+    from sentence_transformers import SentenceTransformer
+
+    from retrieval import normalize_rows
+
+    sentences = sentences or PARITY_SENTENCES
+    reference = normalize_rows(SentenceTransformer(model_name, device='cpu').encode(sentences))
+    candidate = normalize_rows(OnnxEncoder(model_dir, quantized=quantized).encode(sentences))
+    cosines = (reference * candidate).sum(axis=1)
+    print(f"🔬 Cosine agreement over {len(sentences)} sentences: "
+          f"min {cosines.min():.4f}, mean {cosines.mean():.4f}")
+    return float(cosines.min())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or verify the ONNX query encoder.")
+    parser.add_argument('command', choices=['export', 'parity'])
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--dir', default=DEFAULT_MODEL_DIR)
+    parser.add_argument('--fp32', action='store_true', help='check the unquantized model')
+    parser.add_argument('--threshold', type=float, default=PARITY_THRESHOLD,
+                        help='minimum cosine similarity to the PyTorch embeddings')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            export_onnx(args.model, args.dir)
+        parity = check_parity(args.model, args.dir, quantized=not args.fp32)
+    except ImportError as e:
+        print(f"❌ {e}; install requirements.txt and requirements-onnx.txt to export or check the model")
+        sys.exit(2)
+    # Export verifies its own output, so a bad export can never pass silently (NaN fails too)
+    if not parity >= args.threshold:
+        print(f"❌ Parity {parity:.4f} below {args.threshold}; do not serve this export")
+        sys.exit(1)
+    print("✅ ONNX encoder matches the PyTorch model")
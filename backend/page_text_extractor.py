@@ -4,22 +4,24 @@ Script to extract and display all text content from AnNisa.org pages.
 This helps you see what text is available on each page for the chatbot.
 """
 
-import requests
-from bs4 import BeautifulSoup
-import time
 import re
 from urllib.parse import urljoin, urlparse
 import os
 
+from crawler import Crawler
+from html_extract import extract_page
+
 class PageTextExtractor:
-    def __init__(self, base_url="https://annisa.org"):
+    def __init__(self, base_url="https://annisa.org", max_pages=200, max_depth=3, use_sitemap=True):
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.crawler = Crawler(headers={
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
         })
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.use_sitemap = use_sitemap
         
-        # Common pages to check
+        # Common pages to check first; more are discovered from the sitemap and links
         self.pages_to_check = [
             "",  # Home page
             "/about",
@@ -55,62 +57,28 @@ class PageTextExtractor:
     def extract_text_from_url(self, url):
         """Extract all meaningful text from a given URL."""
         print(f"🔍 Checking: {url}")
-        
+        return self.extract_text_from_result(self.crawler.fetch(url))
+
+    def extract_text_from_result(self, result):
+        """Extract all meaningful text from a fetched page."""
+        url = result['url']
         try:
-            response = self.session.get(url, timeout=10)
-            
-            if response.status_code == 404:
-                print(f"   ❌ Page not found (404)")
+            if result['status'] == 404:
+                print(f"   ❌ Page not found (404): {url}")
                 return None
-            elif response.status_code != 200:
-                print(f"   ❌ Error {response.status_code}")
+            elif result['status'] != 200:
+                print(f"   ❌ Error {result['status'] or result['error']}: {url}")
                 return None
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.decompose()
-            
-            # Extract text from main content areas
-            text_elements = []
-            
-            # Try to find main content areas
-            main_selectors = [
-                'main', '[role="main"]', '.main-content', '#main', 
-                '.content', '.page-content', 'article', '.post-content'
-            ]
-            
-            main_content = None
-            for selector in main_selectors:
-                main_content = soup.select_one(selector)
-                if main_content:
-                    break
-            
-            if main_content:
-                # Extract from main content area
-                for element in main_content.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'div']):
-                    text = element.get_text(strip=True)
-                    if text and len(text) > 20:  # Only meaningful text
-                        text_elements.append(text)
-            else:
-                # Fallback: extract from body
-                body = soup.find('body')
-                if body:
-                    for element in body.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li']):
-                        text = element.get_text(strip=True)
-                        if text and len(text) > 20:
-                            text_elements.append(text)
-            
-            # Join and clean all text
-            full_text = ' '.join(text_elements)
-            cleaned_text = self.clean_text(full_text)
+            page = extract_page(result['content'], url)
+            if page is None:
+                print(f"   ❌ Unreadable HTML: {url}")
+                return None
             
-            # Get page title
-            title = soup.find('title')
-            page_title = title.get_text(strip=True) if title else "No title"
+            cleaned_text = self.clean_text(page['text'])
+            page_title = page['title'] or "No title"
             
-            print(f"   ✅ Found {len(cleaned_text)} characters")
+            print(f"   ✅ Found {len(cleaned_text)} characters: {url}")
             
             return {
                 'url': url,
@@ -130,16 +98,15 @@ class PageTextExtractor:
         print("=" * 70)
         
         results = []
+        seeds = [urljoin(self.base_url, page_path) for page_path in self.pages_to_check]
         
-        for page_path in self.pages_to_check:
-            url = urljoin(self.base_url, page_path)
-            result = self.extract_text_from_url(url)
+        # Concurrent crawl with per-host politeness; discovers pages beyond pages_to_check
+        for fetched in self.crawler.crawl(seeds, max_pages=self.max_pages, max_depth=self.max_depth,
+                                          use_sitemap=self.use_sitemap):
+            result = self.extract_text_from_result(fetched)
             
             if result:
                 results.append(result)
-            
-            # Be respectful with timing
-            time.sleep(1)
         
         print("\n" + "=" * 70)
         print("📊 EXTRACTION RESULTS SUMMARY")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Generator stages connected by bounded queues.
+
+`threaded(iterable)` runs an iterator in its own thread and hands its items
+over a bounded queue, so chaining
+
+    pages = threaded(fetch_pages(), 16)
+    chunks = threaded(chunk_pages(pages), 256)
+    for batch in batched(chunks, 64):
+        embed_and_store(batch)
+
+runs fetching, parsing/chunking and embedding concurrently while the queue
+sizes cap how much work is buffered between stages (and so peak memory).
+"""
+
+import queue
+import threading
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar('T')
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def threaded(iterable: Iterable[T], maxsize: int = 32, name: str = 'stage') -> Iterator[T]:
+    """Iterate `iterable` in a background thread, buffering at most `maxsize` items.
+
+    Exceptions raised by the stage are re-raised in the consumer. Closing the
+    returned generator early stops the producer at its next item.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group items into lists of at most `size`."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
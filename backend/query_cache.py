@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Cache of query embeddings keyed on a normalized form of the query text.
+
+Most chatbot traffic is a handful of repeated questions ("how do I volunteer",
+"donate", ...), so skipping the transformer for them removes the dominant CPU
+cost of a request. Entries live in a bounded in-process LRU with a TTL and can
+optionally be backed by a SQLite file shared by every gunicorn worker.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, Unicode forms, punctuation and whitespace."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = _PUNCTUATION.sub(" ", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU/TTL cache of query vectors with optional shared SQLite backing."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 24 * 3600,
+                 shared_path: Optional[str] = None, namespace: str = ""):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_path = shared_path
+        # Vectors from different encoders must never mix
+        self.namespace = namespace
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._puts = 0
+
+    def _key(self, query: str) -> str:
+        return f"{self.namespace}\x00{normalize_query(query)}"
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Per-process SQLite connection (connections must not cross a fork)."""
+        if not self.shared_path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            db = sqlite3.connect(self.shared_path, timeout=1.0, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = self._key(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, created = entry
+                if now - created < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+            vector = self._shared_get(key, now)
+            if vector is not None:
+                self._remember(key, vector, now)
+                self.hits += 1
+                self.shared_hits += 1
+                return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, vector: np.ndarray):
+        key = self._key(query)
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        now = time.time()
+        with self._lock:
+            self._remember(key, vector, now)
+            self._shared_put(key, vector, now)
+
+    def _remember(self, key: str, vector: np.ndarray, created: float):
+        self._entries[key] = (vector, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _shared_get(self, key: str, now: float) -> Optional[np.ndarray]:
+        try:
+            db = self._connection()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT vector, created FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or now - row[1] >= self.ttl:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _shared_put(self, key: str, vector: np.ndarray, now: float):
+        try:
+            db = self._connection()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, created) VALUES (?, ?, ?)",
+                (key, vector.tobytes(), now),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                # Keep the shared table bounded: drop expired rows, then the oldest
+                db.execute("DELETE FROM query_embeddings WHERE created < ?", (now - self.ttl,))
+                db.execute(
+                    "DELETE FROM query_embeddings WHERE key NOT IN "
+                    "(SELECT key FROM query_embeddings ORDER BY created DESC LIMIT ?)",
+                    (self.max_size * 10,),
+                )
+        except sqlite3.Error:
+            # The shared tier is best-effort; the local LRU still works
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "shared": bool(self.shared_path),
+            }
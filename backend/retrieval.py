@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Vector math shared by ingestion and serving.
+
+Embeddings are L2-normalized once when they are written (or when a legacy
+store is loaded), so cosine similarity at query time is a plain dot product
+and top-k selection only needs a partial sort.
+"""
+
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return float32 copies of the rows scaled to unit L2 norm."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Select the k highest scores per row, sorted descending.
+
+    Uses np.argpartition (O(N)) and only sorts the k survivors.
+    Returns (indices, scores), each of shape (num_rows, min(k, N)).
+    """
+    scores = np.atleast_2d(scores)
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return (np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_scores, order, axis=1))
+
+
+def search_dense(matrix: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact inner-product search of a batch of queries against row vectors.
+
+    Both `matrix` and `queries` are expected to be L2-normalized, so the
+    scores are cosine similarities. One matrix product scores the whole batch.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[None, :]
+    scores = queries @ np.asarray(matrix).T
+    return top_k(scores, k)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> Dict[int, float]:
+    """Fuse ranked id lists: score(d) = sum over lists of 1 / (k + rank of d).
+
+    Only ranks matter, so lists with incomparable scores (cosine, BM25) can
+    be combined. Returns {id: fused score}.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            doc_id = int(doc_id)
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0,
+           spherical: bool = True, max_train_points: int = 256) -> np.ndarray:
+    """Train k centroids with Lloyd's algorithm.
+
+    With spherical=True centroids are re-normalized every step, which is the
+    right objective for cosine/inner-product search. Training uses at most
+    `max_train_points` samples per centroid to keep ingest time bounded.
+    """
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    n = len(data)
+    if n == 0:
+        # Nothing to cluster (e.g. an empty knowledge base)
+        return np.zeros((0, data.shape[1]), dtype=np.float32)
+    k = max(1, min(k, n))
+    if n > k * max_train_points:
+        data = data[rng.choice(n, k * max_train_points, replace=False)]
+        n = len(data)
+
+    centroids = data[rng.choice(n, k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_to_centroids(data, centroids, spherical=spherical)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        # Segment sums over rows sorted by cluster (much faster than np.add.at)
+        order = np.argsort(assignments, kind="stable")
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)])[present]
+        sums[present] = np.add.reduceat(data[order], starts, axis=0)
+
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random points instead of dropping them
+            sums[empty] = data[rng.choice(n, int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        new_centroids = sums / counts[:, None]
+        if spherical:
+            new_centroids = normalize_rows(new_centroids)
+        if np.allclose(new_centroids, centroids, atol=1e-6):
+            centroids = new_centroids
+            break
+        centroids = new_centroids
+    return centroids.astype(np.float32)
+
+
+def assign_to_centroids(data: np.ndarray, centroids: np.ndarray, spherical: bool = True,
+                        batch_size: int = 2048) -> np.ndarray:
+    """Index of the nearest centroid for every row.
+
+    Rows are scored in small batches so the score block stays in CPU cache.
+    """
+    centroids = np.asarray(centroids, dtype=np.float32)
+    if spherical:
+        weights = np.ascontiguousarray(centroids.T)
+    else:
+        # argmin ||x - c||^2 == argmax (2 x.c - ||c||^2); a column of ones on
+        # the rows folds the -||c||^2 term into the same matrix product
+        weights = np.vstack([2 * centroids.T, -(centroids ** 2).sum(axis=1)]).astype(np.float32)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), batch_size):
+        batch = np.asarray(data[start:start + batch_size], dtype=np.float32)
+        if not spherical:
+            batch = np.hstack([batch, np.ones((len(batch), 1), dtype=np.float32)])
+        assignments[start:start + batch_size] = (batch @ weights).argmax(axis=1)
+    return assignments
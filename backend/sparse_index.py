@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+BM25 keyword index stored as NumPy arrays.
+
+Dense retrieval misses exact terms such as "ECRF", program names or phone
+numbers. This index keeps, for every term, a postings list of chunk ids with
+their precomputed BM25 weight in CSR form:
+
+    indptr[t]:indptr[t + 1]   slice of doc_ids / weights for term t
+
+so scoring a query is a gather of a few slices and one np.bincount. It is
+built at ingest time and saved next to the embeddings as bm25.json (vocabulary
+and parameters) and bm25.npz (arrays).
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from retrieval import top_k
+
+BM25_META_FILE = "bm25.json"
+BM25_ARRAYS_FILE = "bm25.npz"
+
+TOKEN = re.compile(r"\w+")
+# Frequent function words carry no ranking signal but have the longest postings
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i in is it of on or our "
+    "that the their this to was we what when where which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over chunks; postings hold precomputed per-(term, chunk) weights."""
+
+    def __init__(self, vocabulary: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray,
+                 weights: np.ndarray, num_docs: int, k1: float = 1.2, b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.num_docs = num_docs
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        term_ids, doc_ids, doc_lengths = [], [], []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            doc_ids.extend([doc_id] * len(tokens))
+
+        num_docs = len(doc_lengths)
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        if not term_ids:
+            return cls(vocabulary, np.zeros(len(vocabulary) + 1, dtype=np.int64),
+                       np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32), num_docs, k1, b)
+
+        # Term frequencies: count each (term, doc) pair, sorted by term then doc
+        pairs = np.asarray(term_ids, dtype=np.int64) * num_docs + np.asarray(doc_ids, dtype=np.int64)
+        pairs, tf = np.unique(pairs, return_counts=True)
+        terms = pairs // num_docs
+        docs = (pairs % num_docs).astype(np.int32)
+
+        df = np.bincount(terms, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+        avg_length = max(float(doc_lengths.mean()), 1.0)
+        tf = tf.astype(np.float32)
+        norm = k1 * (1 - b + b * doc_lengths[docs] / avg_length)
+        weights = (idf[terms] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=indptr[1:])
+        return cls(vocabulary, indptr, docs, weights, num_docs, k1, b)
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def scores(self, query: str) -> Optional[np.ndarray]:
+        """BM25 score of every chunk for the query, or None if no query term is indexed."""
+        term_ids = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not term_ids:
+            return None
+        slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        return np.bincount(docs, weights=weights, minlength=self.num_docs)
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k chunk ids and BM25 scores (only chunks matching a query term)."""
+        scores = self.scores(query)
+        if scores is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ids, top_scores = top_k(scores, k)
+        matched = top_scores[0] > 0
+        return ids[0][matched], top_scores[0][matched].astype(np.float32)
+
+    def save(self, path: str):
+        with open(os.path.join(path, BM25_META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"num_docs": self.num_docs, "k1": self.k1, "b": self.b,
+                       "vocabulary": self.vocabulary}, f, ensure_ascii=False)
+        np.savez(os.path.join(path, BM25_ARRAYS_FILE),
+                 indptr=self.indptr, doc_ids=self.doc_ids, weights=self.weights)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Load a saved index, or None if the store version has none."""
+        meta_path = os.path.join(path, BM25_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(path, BM25_ARRAYS_FILE)) as arrays:
+            return cls(meta["vocabulary"], arrays["indptr"], arrays["doc_ids"], arrays["weights"],
+                       meta["num_docs"], meta["k1"], meta["b"])
@@ -0,0 +1,95 @@
+"""Shared fixtures: a local site to crawl and a tiny offline sentence-transformers model."""
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("an nisa hope center women families houston food pantry counseling volunteer donate "
+         "program support help community mental health advocacy relief fund apply contact").split()
+
+
+class LocalSite:
+    """Serves `pages` ({path: html, or an int status}) on localhost."""
+
+    def __init__(self):
+        self.pages = {}
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                page = site.pages.get(self.path, 404)
+                status, body = (page, b'') if isinstance(page, int) else (200, page.encode())
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @staticmethod
+    def page(title: str, paragraphs) -> str:
+        body = ''.join(f"<h2>{title} {i}</h2><p>{text}</p>" for i, text in enumerate(paragraphs))
+        return f"<html><head><title>{title}</title></head><body><main>{body}</main></body></html>"
+
+
+@pytest.fixture
+def site():
+    local = LocalSite()
+    yield local
+    local.server.shutdown()
+
+
+@pytest.fixture(scope='session')
+def tiny_model_dir(tmp_path_factory):
+    """A randomly initialised one-layer BERT with a real fast (Rust) tokenizer, saved locally."""
+    pytest.importorskip('sentence_transformers')
+    tokenizers = pytest.importorskip('tokenizers')
+    transformers = pytest.importorskip('transformers')
+
+    path = str(tmp_path_factory.mktemp('tiny-model'))
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + WORDS + [str(i) for i in range(10)]
+    backend = tokenizers.Tokenizer(tokenizers.models.WordPiece({word: i for i, word in enumerate(vocab)},
+                                                               unk_token='[UNK]'))
+    backend.normalizer = tokenizers.normalizers.BertNormalizer(lowercase=True)
+    backend.pre_tokenizer = tokenizers.pre_tokenizers.BertPreTokenizer()
+    tokenizer = transformers.BertTokenizerFast(tokenizer_object=backend, model_max_length=64)
+    tokenizer.save_pretrained(path)
+    config = transformers.BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=1,
+                                     num_attention_heads=2, intermediate_size=64, max_position_embeddings=64)
+    transformers.BertModel(config).save_pretrained(path)
+    return path
+
+
+@pytest.fixture
+def make_ingester(monkeypatch, tmp_path, tiny_model_dir, site):
+    """Build AnNisaContentIngesters that crawl `site` into a store under tmp_path."""
+    import sentence_transformers
+
+    import ingest
+
+    model = sentence_transformers.SentenceTransformer(tiny_model_dir, device='cpu')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ingest, 'SentenceTransformer', lambda name, device=None: model)
+    for name, value in (('CRAWL_HOST_INTERVAL', '0'), ('CRAWL_SITEMAP', 'false'), ('CRAWL_MAX_RETRIES', '0'),
+                        ('CRAWL_MAX_DEPTH', '0')):
+        monkeypatch.setenv(name, value)
+
+    def make(paths):
+        ingester = ingest.AnNisaContentIngester(site.url)
+        ingester.target_pages = list(paths)
+        return ingester
+    return make
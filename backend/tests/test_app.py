@@ -0,0 +1,60 @@
+"""Flask endpoints, with retrieval and the LLM replaced by canned results."""
+
+import json
+
+import pytest
+
+from llm_client import LLMError
+
+CHUNK = {'id': 0, 'content': 'An-Nisa runs a food pantry.', 'score': 0.9,
+         'metadata': {'url': 'https://annisa.org/food-pantry', 'chunk_id': 0}}
+
+
+class FailingStream:
+    """LLM client whose stream fails after `deltas` deltas."""
+
+    def __init__(self, deltas: int):
+        self.deltas = deltas
+
+    def stream(self, messages, **kwargs):
+        for i in range(self.deltas):
+            yield f"part{i} "
+        raise LLMError("connection reset", status=502, retryable=True)
+
+
+@pytest.fixture
+def chat_app(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('WARMUP_ON_BOOT', '0')
+    monkeypatch.setenv('KB_RELOAD_INTERVAL', '0')
+    import app
+    chatbot = app.chatbot
+    monkeypatch.setattr(chatbot, 'search_knowledge_base', lambda query, top_k=3: [CHUNK])
+    monkeypatch.setattr(chatbot, 'lookup_cached_answer', lambda query, chunks: ([0], None, None))
+    return app
+
+
+def stream_events(client, message: str):
+    body = client.post('/chat/stream', json={'message': message}).get_data(as_text=True)
+    events = []
+    for frame in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in frame.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_failing_midway_ends_with_error_not_done(monkeypatch, chat_app):
+    monkeypatch.setattr(chat_app.chatbot, 'llm', FailingStream(deltas=2))
+    events = stream_events(chat_app.app.test_client(), 'Where is the food pantry?')
+
+    names = [name for name, _ in events]
+    assert names == ['meta', 'delta', 'delta', 'error']
+    assert events[-1][1]['partial'] is True
+
+
+def test_stream_failing_before_any_delta_sends_fallback_and_done(monkeypatch, chat_app):
+    monkeypatch.setattr(chat_app.chatbot, 'llm', FailingStream(deltas=0))
+    events = stream_events(chat_app.app.test_client(), 'Where is the food pantry?')
+
+    assert [name for name, _ in events] == ['meta', 'delta', 'done']
+    assert events[1][1]['content'].startswith(chat_app.FALLBACK_INTRO)
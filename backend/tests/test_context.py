@@ -0,0 +1,27 @@
+"""Sentence selection when the context is over its token budget."""
+
+from context import ContextAssembler
+
+QUERY = 'food pantry'
+# (sentence, chunk rank); chunk 2's best sentence matches the query best but is long
+UNITS = [("Our pantry serves families.", 0), ("Volunteers are welcome.", 0),
+         ("The pantry is downtown.", 1), ("Call us anytime.", 1),
+         ("The food pantry food drive collects food for the food pantry.", 2), ("Donate today.", 2)]
+LENGTHS = [5, 4, 5, 4, 20, 3]
+BEST = {0: 0, 1: 2, 2: 4}
+
+
+def test_every_chunk_keeps_its_best_sentence_when_they_fit():
+    keep = ContextAssembler().select(QUERY, UNITS, LENGTHS, budget=sum(LENGTHS[i] for i in BEST.values()))
+    assert keep == set(BEST.values())
+
+
+def test_better_retrieved_chunks_keep_their_best_sentence_first():
+    keep = ContextAssembler().select(QUERY, UNITS, LENGTHS, budget=22)
+    assert {BEST[0], BEST[1]} <= keep
+    assert BEST[2] not in keep
+    assert sum(LENGTHS[i] for i in keep) <= 22
+
+
+def test_top_chunk_keeps_its_best_sentence_over_budget():
+    assert ContextAssembler().select(QUERY, UNITS, LENGTHS, budget=2) == {BEST[0]}
@@ -0,0 +1,44 @@
+"""Streaming ingest against a local site, with a real fast tokenizer."""
+
+import random
+
+import ingest
+from conftest import WORDS
+from kb_store import open_knowledge_base
+
+
+def paragraphs(seed: int, count: int = 6, words: int = 40):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.' for _ in range(count)]
+
+
+def test_threaded_pipeline_shares_no_tokenizer_state(monkeypatch, site, make_ingester):
+    # Small embed batches keep the encoder busy while the chunking thread tokenizes
+    monkeypatch.setattr(ingest, 'EMBED_BATCH_SIZE', 2)
+    paths = [f"/page-{i}" for i in range(40)]
+    for i, path in enumerate(paths):
+        site.pages[path] = site.page(f"Page {i}", paragraphs(i))
+
+    ingester = make_ingester(paths)
+    assert ingester.process_urls()
+    store = open_knowledge_base()
+    assert {meta['url'] for meta in store.metadata} >= {site.url + path for path in paths}
+
+
+def test_reingest_drops_gone_pages_and_keeps_transient_failures(site, make_ingester):
+    paths = ['/kept', '/deleted', '/flaky']
+    for i, path in enumerate(paths):
+        site.pages[path] = site.page(path.strip('/').title(), paragraphs(i, count=2))
+    assert make_ingester(paths).process_urls()
+
+    site.pages['/deleted'] = 404
+    site.pages['/flaky'] = 503
+    ingester = make_ingester(paths)
+    assert ingester.process_urls()
+
+    urls = {meta['url'] for meta in open_knowledge_base().metadata}
+    assert site.url + '/kept' in urls
+    assert site.url + '/flaky' in urls
+    assert site.url + '/deleted' not in urls
+    assert site.url + '/deleted' not in ingester.manifest.pages
+    assert site.url + '/flaky' in ingester.manifest.pages
@@ -0,0 +1,36 @@
+"""Vector index backends on edge-case inputs."""
+
+import numpy as np
+import pytest
+
+from kb_store import KnowledgeBaseStore, save_knowledge_base
+from quantization import ProductQuantizer
+from vector_index import build_index, load_index
+
+KINDS = ['flat', 'ivf', 'hnsw', 'sq8', 'pq']
+
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_empty_knowledge_base_builds_and_searches(kind, tmp_path):
+    root = str(tmp_path / 'kb')
+    save_knowledge_base([], np.zeros((0, 16), dtype=np.float32), [], root=root, index_kind=kind)
+
+    store = KnowledgeBaseStore.open(root)
+    index = load_index(store.path, store.embeddings)
+    assert index.kind == kind
+    ids, scores = index.search(np.ones((2, store.embeddings.shape[1]), dtype=np.float32), 3)
+    assert ids.shape == scores.shape == (2, 0)
+
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_empty_matrix_builds(kind):
+    index = build_index(kind, np.zeros((0, 16), dtype=np.float32))
+    assert len(index) == 0
+    ids, scores = index.search(np.ones((2, 16), dtype=np.float32), 3)
+    assert ids.shape == scores.shape == (2, 0)
+
+
+def test_product_quantizer_trains_on_no_vectors():
+    quantizer = ProductQuantizer.train(np.zeros((0, 16), dtype=np.float32), m=4)
+    assert quantizer.codes.shape == (4, 0)
+    assert quantizer.scores(np.ones((3, 16), dtype=np.float32)).shape == (3, 0)
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Nearest-neighbour indexes over the (L2-normalized) knowledge base embeddings.
+
+Three interchangeable backends share the same search(queries, k) interface:
+
+- FlatIndex: exact brute-force scan, best for a few thousand chunks.
+- IVFIndex: k-means coarse quantizer; only the `nprobe` closest inverted
+  lists are scanned. Raise nprobe for recall, lower it for latency.
+- HNSWIndex: hierarchical navigable small-world graph. Raise ef_search for
+  recall, lower it for latency; M / ef_construction trade build time and
+  memory for graph quality.
+- CompressedIndex ("sq8" / "pq"): scans int8 or product-quantized codes and
+  re-ranks the best `rerank` x k candidates with the full-precision vectors.
+
+Indexes only store ids and graph/list structure; vectors come from the
+knowledge base store, so the (memory-mapped) embedding matrix is never copied.
+An index is persisted next to the store as index.json + index.npz.
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from quantization import QUANTIZER_TYPES, ProductQuantizer, ScalarQuantizer
+from retrieval import assign_to_centroids, kmeans, search_dense, top_k
+
+INDEX_META_FILE = "index.json"
+INDEX_DATA_FILE = "index.npz"
+# Queries scored per pass over compressed codes (bounds the num_queries x N score buffer)
+COMPRESSED_QUERY_BATCH = 32
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """Base class for nearest-neighbour indexes over a fixed vector matrix."""
+
+    kind = "base"
+    # Knobs that can change on a built index; the rest are fixed at build time
+    search_params: Tuple[str, ...] = ()
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def params(self) -> Dict:
+        return {}
+
+    def set_params(self, **params):
+        """Adjust search-time knobs (e.g. nprobe, ef_search) in place.
+
+        Build-time parameters cannot change without a rebuild and are ignored.
+        """
+        for key, value in params.items():
+            if value is None:
+                continue
+            if key not in self.search_params:
+                logger.warning(f"Ignoring {key}={value} for the {self.kind} index: not a search-time parameter")
+                continue
+            setattr(self, key, type(self.params[key])(value))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, scores) of shape (num_queries, <=k), best first."""
+        raise NotImplementedError
+
+    def warm(self):
+        """Fault in the data every search scans (here the full-precision vectors)."""
+        _touch_pages(self.vectors)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def save(self, path: str):
+        """Persist the index structure into a store version directory."""
+        with open(os.path.join(path, INDEX_META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind, "params": self.params, "count": len(self)}, f, indent=2)
+        arrays = self._arrays()
+        if arrays:
+            np.savez(os.path.join(path, INDEX_DATA_FILE), **arrays)
+
+    @classmethod
+    def _from_arrays(cls, vectors: np.ndarray, params: Dict, arrays) -> "VectorIndex":
+        return cls(vectors, **params)
+
+
+class FlatIndex(VectorIndex):
+    """Exact search: one matrix product plus a partial sort."""
+
+    kind = "flat"
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return search_dense(self.vectors, queries, k)
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index with a spherical k-means coarse quantizer."""
+
+    kind = "ivf"
+    search_params = ("nprobe",)
+
+    def __init__(self, vectors: np.ndarray, nlist: int = 0, nprobe: int = 8,
+                 centroids: Optional[np.ndarray] = None, list_ids: Optional[np.ndarray] = None,
+                 list_offsets: Optional[np.ndarray] = None, seed: int = 0):
+        super().__init__(vectors)
+        self.nprobe = nprobe
+        if centroids is None:
+            # ~sqrt(N) lists keeps both the coarse and the fine scan small
+            nlist = nlist or max(1, int(round(math.sqrt(len(vectors)))))
+            centroids = kmeans(vectors, nlist, seed=seed)
+            assignments = assign_to_centroids(vectors, centroids)
+            list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+            counts = np.bincount(assignments, minlength=len(centroids))
+            list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.centroids = centroids
+        self.list_ids = list_ids
+        self.list_offsets = list_offsets
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def params(self) -> Dict:
+        return {"nlist": self.nlist, "nprobe": self.nprobe}
+
+    def probe(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Candidate ids from the closest inverted lists for one query."""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        lists, _ = top_k(self.centroids @ query, nprobe)
+        return np.concatenate([
+            self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in lists[0]
+        ])
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if self.nlist == 0:
+            # Built over an empty knowledge base
+            return _trim(ids, scores)
+        for row, query in enumerate(queries):
+            candidates = np.sort(self.probe(query))
+            if len(candidates) == 0:
+                continue
+            local, local_scores = top_k(self.vectors[candidates] @ query, k)
+            found = local.shape[1]
+            ids[row, :found] = candidates[local[0]]
+            scores[row, :found] = local_scores[0]
+        return _trim(ids, scores)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids, "list_ids": self.list_ids, "list_offsets": self.list_offsets}
+
+    @classmethod
+    def _from_arrays(cls, vectors, params, arrays) -> "IVFIndex":
+        return cls(vectors, nprobe=params.get("nprobe", 8), centroids=arrays["centroids"],
+                   list_ids=arrays["list_ids"], list_offsets=arrays["list_offsets"])
+
+
+class HNSWIndex(VectorIndex):
+    """Hierarchical navigable small-world graph (Malkov & Yashunin) in NumPy."""
+
+    kind = "hnsw"
+    search_params = ("ef_search",)
+
+    def __init__(self, vectors: np.ndarray, M: int = 16, ef_construction: int = 100,
+                 ef_search: int = 50, seed: int = 0, levels: Optional[np.ndarray] = None,
+                 graph: Optional[list] = None, entry_point: int = -1):
+        super().__init__(vectors)
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        if graph is None:
+            self._build(seed)
+        else:
+            self.levels = levels
+            self.graph = graph
+            self.entry_point = entry_point
+
+    @property
+    def params(self) -> Dict:
+        return {"M": self.M, "ef_construction": self.ef_construction, "ef_search": self.ef_search}
+
+    def _max_degree(self, level: int) -> int:
+        return self.M * 2 if level == 0 else self.M
+
+    def _build(self, seed: int):
+        n = len(self.vectors)
+        rng = np.random.default_rng(seed)
+        level_mult = 1 / math.log(max(self.M, 2))
+        self.levels = np.floor(-np.log(1 - rng.random(n)) * level_mult).astype(np.int64)
+        self.graph = [dict() for _ in range(int(self.levels.max()) + 1 if n else 1)]
+        self.entry_point = -1
+
+        for node in range(n):
+            self._insert(node)
+
+    def _insert(self, node: int):
+        node_level = int(self.levels[node])
+        for level in range(node_level + 1):
+            self.graph[level][node] = []
+        if self.entry_point < 0:
+            self.entry_point = node
+            return
+
+        query = np.asarray(self.vectors[node], dtype=np.float32)
+        entry = [self.entry_point]
+        top_level = int(self.levels[self.entry_point])
+        for level in range(top_level, node_level, -1):
+            entry = [self._search_layer(query, entry, 1, level)[0][1]]
+
+        for level in range(min(node_level, top_level), -1, -1):
+            found = self._search_layer(query, entry, self.ef_construction, level)
+            neighbours = self._select_neighbours([idx for _, idx in found],
+                                                 np.array([score for score, _ in found]), self.M)
+            self.graph[level][node] = neighbours
+            for other in neighbours:
+                links = self.graph[level][other]
+                links.append(node)
+                if len(links) > self._max_degree(level):
+                    self._prune(other, level)
+            entry = [idx for _, idx in found]
+
+        if node_level > top_level:
+            self.entry_point = node
+
+    def _select_neighbours(self, candidates: list, sims: np.ndarray, limit: int) -> list:
+        """Diversity heuristic: skip candidates closer to a chosen neighbour than to the node.
+
+        `candidates` are ordered best first with `sims` their similarity to the
+        node. Keeping spread-out links preserves connectivity between clusters,
+        which a plain top-M selection does not.
+        """
+        if len(candidates) <= limit:
+            return list(candidates)
+        vectors = np.asarray(self.vectors[candidates], dtype=np.float32)
+        pairwise = vectors @ vectors.T
+        closest_selected = np.full(len(candidates), -np.inf, dtype=np.float32)
+        selected = []
+        for i in range(len(candidates)):
+            if closest_selected[i] < sims[i]:
+                selected.append(i)
+                if len(selected) == limit:
+                    break
+                np.maximum(closest_selected, pairwise[i], out=closest_selected)
+        if len(selected) < limit:
+            # Top up with the closest skipped candidates so the degree stays near the limit
+            chosen = set(selected)
+            selected += [i for i in range(len(candidates)) if i not in chosen][:limit - len(selected)]
+        return [candidates[i] for i in selected]
+
+    def _prune(self, node: int, level: int):
+        """Shrink an over-full neighbour list with the same selection heuristic."""
+        links = np.asarray(self.graph[level][node])
+        sims = self.vectors[links] @ np.asarray(self.vectors[node], dtype=np.float32)
+        order = np.argsort(-sims)
+        self.graph[level][node] = self._select_neighbours(links[order].tolist(), sims[order],
+                                                          self._max_degree(level))
+
+    def _search_layer(self, query: np.ndarray, entry: list, ef: int, level: int) -> list:
+        """Best-first search on one layer; returns [(score, id)] best first."""
+        layer = self.graph[level]
+        visited = set(entry)
+        entry_scores = self.vectors[entry] @ query
+        candidates = [(-float(s), e) for s, e in zip(entry_scores, entry)]
+        heapq.heapify(candidates)
+        results = [(float(s), e) for s, e in zip(entry_scores, entry)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_score, current = heapq.heappop(candidates)
+            if -neg_score < results[0][0] and len(results) >= ef:
+                break
+            fresh = [n for n in layer.get(current, ()) if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            scores = self.vectors[fresh] @ query
+            for score, neighbour in zip(scores.tolist(), fresh):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbour))
+                    heapq.heappush(results, (score, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if self.entry_point < 0:
+            return _trim(ids, scores)
+
+        for row, query in enumerate(queries):
+            entry = [self.entry_point]
+            for level in range(int(self.levels[self.entry_point]), 0, -1):
+                entry = [self._search_layer(query, entry, 1, level)[0][1]]
+            found = self._search_layer(query, entry, max(self.ef_search, k), 0)[:k]
+            ids[row, :len(found)] = [idx for _, idx in found]
+            scores[row, :len(found)] = [score for score, _ in found]
+        return _trim(ids, scores)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"levels": self.levels, "entry_point": np.asarray(self.entry_point)}
+        for level, layer in enumerate(self.graph):
+            nodes = np.fromiter(layer.keys(), dtype=np.int64, count=len(layer))
+            neighbours = np.full((len(nodes), self._max_degree(level)), -1, dtype=np.int64)
+            for row, node in enumerate(nodes):
+                links = layer[node]
+                neighbours[row, :len(links)] = links
+            arrays[f"nodes_{level}"] = nodes
+            arrays[f"neighbours_{level}"] = neighbours
+        return arrays
+
+    @classmethod
+    def _from_arrays(cls, vectors, params, arrays) -> "HNSWIndex":
+        levels = arrays["levels"]
+        graph = []
+        level = 0
+        while f"nodes_{level}" in arrays:
+            nodes, neighbours = arrays[f"nodes_{level}"], arrays[f"neighbours_{level}"]
+            graph.append({
+                int(node): [int(n) for n in row if n >= 0]
+                for node, row in zip(nodes, neighbours)
+            })
+            level += 1
+        return cls(vectors, M=params.get("M", 16), ef_construction=params.get("ef_construction", 100),
+                   ef_search=params.get("ef_search", 50), levels=levels, graph=graph,
+                   entry_point=int(arrays["entry_point"]))
+
+
+class CompressedIndex(VectorIndex):
+    """Scan compressed codes, then re-rank candidates with exact inner products.
+
+    Only the codes need to stay resident; the full-precision matrix is
+    memory-mapped and touched just for the re-ranked candidates.
+    """
+
+    kind = "compressed"
+    search_params = ("rerank",)
+    quantizer_type = None
+
+    def __init__(self, vectors: np.ndarray, rerank: int = 10, quantizer=None, **train_params):
+        super().__init__(vectors)
+        self.rerank = rerank
+        self.quantizer = quantizer or self.quantizer_type.train(vectors, **train_params)
+
+    @property
+    def params(self) -> Dict:
+        return {"rerank": self.rerank}
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for start in range(0, len(queries), COMPRESSED_QUERY_BATCH):
+            batch = queries[start:start + COMPRESSED_QUERY_BATCH]
+            # One pass over the codes scores the whole batch
+            shortlists, _ = top_k(self.quantizer.scores(batch), k * max(self.rerank, 1))
+            for row, (query, candidates) in enumerate(zip(batch, shortlists), start):
+                candidates = np.sort(candidates)
+                local, local_scores = top_k(self.vectors[candidates] @ query, k)
+                found = local.shape[1]
+                ids[row, :found] = candidates[local[0]]
+                scores[row, :found] = local_scores[0]
+        return _trim(ids, scores)
+
+    def warm(self):
+        """Scan the codes once; the full-precision vectors are only read for re-ranking."""
+        self.quantizer.scores(np.zeros(self.vectors.shape[1], dtype=np.float32))
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return self.quantizer.arrays()
+
+    @classmethod
+    def _from_arrays(cls, vectors, params, arrays) -> "CompressedIndex":
+        quantizer = QUANTIZER_TYPES[cls.kind].from_arrays(arrays)
+        return cls(vectors, rerank=params.get("rerank", 10), quantizer=quantizer)
+
+
+class SQ8Index(CompressedIndex):
+    """int8 scalar-quantized scan (4x smaller than float32) with exact re-ranking."""
+
+    kind = "sq8"
+    quantizer_type = ScalarQuantizer
+
+
+class PQIndex(CompressedIndex):
+    """Product-quantized scan with lookup tables (up to 16x smaller) and exact re-ranking."""
+
+    kind = "pq"
+    quantizer_type = ProductQuantizer
+
+    @property
+    def params(self) -> Dict:
+        return {"m": self.quantizer.m, "rerank": self.rerank}
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (FlatIndex, IVFIndex, HNSWIndex, SQ8Index, PQIndex)}
+
+# Bytes per memory page; warming reads one value from each
+PAGE_BYTES = 4096
+
+# Environment variables for each backend's build knobs (applied when ingest builds the index)
+INDEX_BUILD_ENV = {
+    "flat": {},
+    "ivf": {"nlist": "IVF_NLIST"},
+    "hnsw": {"M": "HNSW_M", "ef_construction": "HNSW_EF_CONSTRUCTION"},
+    "sq8": {},
+    "pq": {"m": "PQ_M"},
+}
+
+# ... and for its search knobs, which also override the persisted values at load
+INDEX_SEARCH_ENV = {
+    "flat": {},
+    "ivf": {"nprobe": "IVF_NPROBE"},
+    "hnsw": {"ef_search": "HNSW_EF_SEARCH"},
+    "sq8": {"rerank": "INDEX_RERANK"},
+    "pq": {"rerank": "INDEX_RERANK"},
+}
+
+
+def _read_env(variables: Dict[str, str]) -> Dict:
+    return {param: int(os.environ[env]) for param, env in variables.items() if os.environ.get(env)}
+
+
+def index_params_from_env(kind: str) -> Dict:
+    """Read the build and search knobs for an index kind from the environment (unset ones are omitted)."""
+    return {**_read_env(INDEX_BUILD_ENV.get(kind, {})), **_read_env(INDEX_SEARCH_ENV.get(kind, {}))}
+
+
+def search_params_from_env(kind: str) -> Dict:
+    """Read only the search knobs for an index kind, for applying to a loaded index."""
+    return _read_env(INDEX_SEARCH_ENV.get(kind, {}))
+
+
+def _touch_pages(array: np.ndarray):
+    """Read one value per page of a (memory-mapped) array without copying or reducing all of it."""
+    flat = np.asarray(array).reshape(-1)
+    if flat.size:
+        float(flat[::max(1, PAGE_BYTES // flat.itemsize)].sum())
+
+
+def _trim(ids: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Drop trailing columns that no query managed to fill."""
+    filled = int((ids >= 0).sum(axis=1).max()) if len(ids) else 0
+    return ids[:, :filled], scores[:, :filled]
+
+
+def build_index(kind: str, vectors: np.ndarray, **params) -> VectorIndex:
+    """Build an index of the given kind ('flat', 'ivf', 'hnsw', 'sq8' or 'pq')."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index kind '{kind}', expected one of {sorted(INDEX_TYPES)}")
+    params = {key: value for key, value in params.items() if value is not None}
+    return INDEX_TYPES[kind](vectors, **params)
+
+
+def load_index(path: Optional[str], vectors: np.ndarray) -> VectorIndex:
+    """Load the index persisted in a store version directory.
+
+    Falls back to an exact FlatIndex when no index was built for the store.
+    """
+    meta_path = os.path.join(path, INDEX_META_FILE) if path and os.path.isdir(path) else None
+    if meta_path is None or not os.path.exists(meta_path):
+        return FlatIndex(vectors)
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("count") != len(vectors):
+        raise ValueError(f"Index in {path} covers {meta.get('count')} vectors, store has {len(vectors)}")
+
+    data_path = os.path.join(path, INDEX_DATA_FILE)
+    arrays = {}
+    if os.path.exists(data_path):
+        with np.load(data_path) as data:
+            arrays = {key: data[key] for key in data.files}
+    return INDEX_TYPES[meta["kind"]]._from_arrays(vectors, meta.get("params", {}), arrays)
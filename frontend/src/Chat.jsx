@@ -10,6 +10,7 @@ const Chat = () => {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const [error, setError] = useState('');
   const messagesEndRef = useRef(null);
 
@@ -42,6 +43,61 @@ const Chat = () => {
     }
   };
 
+  // Parse one Server-Sent Event block ("event: x\ndata: {...}")
+  const parseEvent = (block) => {
+    let event = 'message';
+    let data = '';
+    block.split('\n').forEach((line) => {
+      if (line.startsWith('event:')) {
+        event = line.slice(6).trim();
+      } else if (line.startsWith('data:')) {
+        data += line.slice(5).trim();
+      }
+    });
+    return { event, data: data ? JSON.parse(data) : {} };
+  };
+
+  // Stream the answer from /chat/stream, calling onDelta for each text fragment.
+  // Throws if streaming is unavailable so the caller can fall back to /chat.
+  const streamMessage = async (message, onDelta) => {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+      },
+      body: JSON.stringify({ message }),
+    });
+
+    if (!response.ok || !response.body || !response.body.getReader) {
+      throw new Error(`Streaming unavailable (status: ${response.status})`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const { event, data } = parseEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+
+        if (event === 'delta' && data.content) {
+          onDelta(data.content);
+        } else if (event === 'error') {
+          throw new Error(data.error || 'Stream error');
+        } else if (event === 'done') {
+          return;
+        }
+      }
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     
@@ -55,23 +111,53 @@ const Chat = () => {
     setMessages(prev => [...prev, { role: 'user', content: userMessage }]);
     setIsLoading(true);
 
+    let streamed = false;
     try {
-      const response = await sendMessage(userMessage);
-      
-      // Add assistant response
-      setMessages(prev => [...prev, {
-        role: 'assistant',
-        content: response.response
-      }]);
+      try {
+        // Render the answer incrementally as it streams in
+        await streamMessage(userMessage, (delta) => {
+          if (!streamed) {
+            streamed = true;
+            // Swap the typing indicator for the growing answer
+            setIsLoading(false);
+            setIsStreaming(true);
+            setMessages(prev => [...prev, { role: 'assistant', content: delta }]);
+          } else {
+            setMessages(prev => {
+              const updated = [...prev];
+              const last = updated[updated.length - 1];
+              updated[updated.length - 1] = { ...last, content: last.content + delta };
+              return updated;
+            });
+          }
+        });
+      } catch (streamError) {
+        // Keep a partially streamed answer; otherwise fall back to the JSON endpoint
+        if (streamed) throw streamError;
+        console.warn('Streaming failed, falling back to /chat:', streamError);
+      }
+
+      if (!streamed) {
+        const response = await sendMessage(userMessage);
+        
+        // Add assistant response
+        setMessages(prev => [...prev, {
+          role: 'assistant',
+          content: response.response
+        }]);
+      }
     } catch (error) {
       setError('Failed to send message. Please check if the backend is running.');
-      // Add error message
-      setMessages(prev => [...prev, {
-        role: 'assistant',
-        content: 'Sorry, I\'m having trouble connecting to the server. Please make sure the backend is running and try again.'
-      }]);
+      // Add error message (unless part of the answer is already on screen)
+      if (!streamed) {
+        setMessages(prev => [...prev, {
+          role: 'assistant',
+          content: 'Sorry, I\'m having trouble connecting to the server. Please make sure the backend is running and try again.'
+        }]);
+      }
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
 
@@ -128,11 +214,11 @@ const Chat = () => {
           value={input}
           onChange={(e) => setInput(e.target.value)}
           placeholder="Ask about AnNisa.org programs, volunteer opportunities, donations..."
-          disabled={isLoading}
+          disabled={isLoading || isStreaming}
           className="chat-input"
         />
-        <button type="submit" disabled={isLoading || !input.trim()} className="send-button">
-          {isLoading ? '...' : 'Send'}
+        <button type="submit" disabled={isLoading || isStreaming || !input.trim()} className="send-button">
+          {isLoading || isStreaming ? '...' : 'Send'}
         </button>
       </form>
 